@@ -0,0 +1,300 @@
+"""
+Async serving mode for the I/O-bound routes. This is a PARTIAL app, not a
+replacement for app.py.
+
+File serving, status polling and report submission use the Motor driver and
+async GridFS streams, so one process can serve many concurrent PDF viewers
+and pollers. Excel extraction is CPU-bound and runs in an executor.
+
+Served here:
+    /patient_files/<batch>/<patient>/<type>, /f/<batch>/<patient>,
+    /get-report-status, /update-availability, /submit-report, /submit-reports,
+    /get-batches, /get-batches/<batch>, /get-batch-data, /get-batch-data2
+    (whole batch only: no limit/after paging, NDJSON, stored job results or
+    async=1), /pool-stats, /metrics
+
+Only served by app.py (route these paths to the Flask app):
+    /upload-pdf, /excel-download, /json/..., /variants, /variants/patients,
+    /jobs/..., /cache-stats
+
+    hypercorn async_app:app --bind 0.0.0.0:5000 --workers 2
+
+MONGO_URI must be set (the app refuses to start without it); point it at a
+local mongod (e.g. mongodb://localhost:27017) to run against a stand-in.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from quart import Quart, Response, request, jsonify
+from quart_cors import cors
+from motor.motor_asyncio import AsyncIOMotorGridOut
+from mongo_connection import get_async_db, pool_stats, require_mongo_uri
+from services.async_stream_service import async_send_gridfs_file
+from services.file_service import get_batch_directory, get_batch_patients
+from services.patient_service import extract_batch_data, extract_batch_data2, projection_from_args
+from services.report_service import (
+    availability_update, backfill_status_timestamps_async, fetch_report_status_async, insert_report_async,
+    report_write_concern, submit_reports_async, validate_report
+)
+from config.config import REPORT_BULK_MAX
+from services.compression import init_async_app as init_compression
+from services.json_provider import FastJSONProvider
+from services.metrics import TracedBody, begin_request, current_trace, finish_request, render_metrics
+
+require_mongo_uri()
+
+app = Quart(__name__)
+app.json = FastJSONProvider(app)
+app = cors(app, allow_origin="*", expose_headers=["ETag", "X-Status-Token", "X-Next-Cursor"])
+app.config["RESPONSE_TIMEOUT"] = float(os.environ.get("ASYNC_RESPONSE_TIMEOUT", 0)) or None  # Long PDF streams
+
+PATIENT_FILE_MAP = {
+    "pdf": "{patient_id}.pdf",
+    "consent": "{patient_id}_Consent.pdf",
+    "blood_reports": "{patient_id}_Blood_work.pdf"
+}
+
+@app.before_request
+async def begin_trace():
+    begin_request(request.url_rule.rule if request.url_rule else "unmatched")
+
+@app.after_request
+async def finish_trace(response):
+    if isinstance(response.response, response.data_body_class):
+        finish_request(request.method, response.status_code)
+    else:  # ✅ Streamed (e.g. GridFS files): finish once the body has been sent
+        response.response = TracedBody(response.response, request.method, response.status_code, current_trace())
+    return response
+
+init_compression(app)  # ✅ Runs before finish_trace, so compression time is part of the trace
+
+@app.before_serving
+async def backfill_status_timestamps():
+    await backfill_status_timestamps_async(get_async_db())  # ✅ updated_at for statuses written before it existed
+
+async def run_in_executor(func, *args):
+    """
+    Runs blocking, CPU-heavy work (Excel parsing) off the event loop, in a
+    copy of the request's context so its stages and round-trips are traced.
+    """
+    context = contextvars.copy_context()
+    return await asyncio.get_running_loop().run_in_executor(None, functools.partial(context.run, func, *args))
+
+@app.route("/patient_files/<batch_name>/<patient_id>/<file_type>", methods=["GET"])
+async def serve_patient_file(batch_name, patient_id, file_type):
+    """
+    Streams a patient PDF from GridFS (Range and conditional GET aware).
+    """
+    if file_type not in PATIENT_FILE_MAP:
+        return jsonify({"error": "Invalid file type"}), 400
+
+    db = get_async_db()
+    try:
+        file_record = await db["fs.files"].find_one({"filename": PATIENT_FILE_MAP[file_type].format(patient_id=patient_id)})
+        if not file_record:
+            return jsonify({"error": "File not found"}), 404
+
+        return await async_send_gridfs_file(AsyncIOMotorGridOut(db["fs"], file_document=file_record), mimetype="application/pdf")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/f/<batch_name>/<patient_id>", methods=["GET"])
+async def download_excel(batch_name, patient_id):
+    """
+    Streams the latest Excel file for a patient from GridFS.
+    """
+    db = get_async_db()
+    try:
+        file_doc = await db["fs.files"].find_one(
+            {"patient_id": patient_id, "batch": batch_name, "file_type": "excel"}, sort=[("uploadDate", -1)]
+        )
+        if not file_doc:
+            return jsonify({"error": "No Excel file found for this patient"}), 404
+
+        return await async_send_gridfs_file(
+            AsyncIOMotorGridOut(db["fs"], file_document=file_doc),
+            as_attachment=True,
+            download_name=file_doc["filename"],
+            mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+    except Exception as e:
+        return jsonify({"error": f"Error fetching Excel file: {str(e)}"}), 500
+
+@app.route("/get-report-status", methods=["GET"])
+async def get_report_status():
+    """
+    Fetches report submission and availability status (supports since=<token> and ETags).
+    """
+    batch_name = request.args.get("batch_name", "").strip()
+    if not batch_name:
+        return jsonify({"error": "Batch name is required"}), 400
+
+    try:
+        patient_reports, token = await fetch_report_status_async(get_async_db(), batch_name, since_token=request.args.get("since"))
+    except ValueError:
+        return jsonify({"error": "Invalid since token"}), 400
+
+    response = jsonify(patient_reports)
+    if token:
+        response.headers["X-Status-Token"] = token
+    await response.add_etag()
+    return await response.make_conditional(request)
+
+@app.route("/update-availability", methods=["POST"])
+async def update_availability():
+    """
+    Updates patient availability status (Available = 🟠, Not Available = 🔴).
+    """
+    try:
+        json_data = await request.get_json()
+        batch_name = json_data.get("batch_name", "").strip()
+        patient_id = json_data.get("patient_id", "").strip()
+        availability = json_data.get("availability", "").strip()
+
+        if not batch_name or not patient_id or availability not in ["available", "not_available"]:
+            return jsonify({"error": "Invalid data received"}), 400
+
+        await get_async_db()["availability_status"].update_one(
+            {"batch": batch_name, "patient_id": patient_id},
+            availability_update(availability == "available"),
+            upsert=True
+        )
+
+        return jsonify({"message": "Availability status updated successfully"}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Failed to update availability: {str(e)}"}), 500
+
+@app.route("/submit-report", methods=["POST"])
+async def submit_report():
+    """
+    Saves the submitted report details in MongoDB.
+    """
+    try:
+        report_entry, error = validate_report(await request.get_json())
+        if error:
+            return jsonify({"error": error}), 400
+
+        inserted_id = await insert_report_async(get_async_db(), report_entry)
+
+        return jsonify({"message": "Report submitted successfully", "report_id": str(inserted_id)}), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Failed to submit report: {str(e)}"}), 500
+
+@app.route("/submit-reports", methods=["POST"])
+async def submit_reports_bulk():
+    """
+    Saves many submitted reports with one unordered bulk write.
+    """
+    try:
+        json_data = await request.get_json()
+        reports = json_data.get("reports")
+        if not isinstance(reports, list) or not reports:
+            return jsonify({"error": "Invalid data received"}), 400
+        if len(reports) > REPORT_BULK_MAX:
+            return jsonify({"error": f"At most {REPORT_BULK_MAX} reports per request"}), 400
+
+        try:
+            write_concern = report_write_concern(json_data.get("w", request.args.get("w")))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        results = await submit_reports_async(
+            get_async_db(), reports, default_batch=json_data.get("selectedBatch", ""), write_concern=write_concern
+        )
+        submitted = sum(1 for r in results if r["status"] in ("submitted", "sent"))
+
+        return jsonify({
+            "message": f"Submitted {submitted} of {len(results)} reports",
+            "submitted": submitted,
+            "failed": len(results) - submitted,
+            "results": results
+        }), 200
+
+    except Exception as e:
+        return jsonify({"error": f"Failed to submit reports: {str(e)}"}), 500
+
+async def versioned_response(payload, version):
+    """
+    JSON response carrying the batch directory version as its ETag.
+    """
+    response = jsonify(payload)
+    response.set_etag(f"batches-{version}")
+    response.cache_control.no_cache = True
+    return await response.make_conditional(request)
+
+@app.route("/get-batches", methods=["GET"])
+async def get_batches():
+    """
+    Fetch batches with patient files (cached until the next ingest).
+    """
+    try:
+        version, batch_data = await run_in_executor(get_batch_directory)
+        return await versioned_response(batch_data, version)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/get-batches/<batch_name>", methods=["GET"])
+async def get_batch(batch_name):
+    """
+    Fetch the patient ids of one batch.
+    """
+    try:
+        version, patient_ids = await run_in_executor(get_batch_patients, batch_name)
+        if patient_ids is None:
+            return jsonify({"error": f"Batch '{batch_name}' not found in database"}), 404
+        return await versioned_response({"batch_name": batch_name, "patients": patient_ids}, version)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route("/get-batch-data", methods=["GET"])
+async def get_batch_data():
+    """
+    Fetch all patient subcategories of a batch; parsing runs in an executor.
+    """
+    batch_name = request.args.get("batch_name", "")
+    if not batch_name:
+        return jsonify({"error": "Missing batch_name"}), 400
+
+    try:
+        projection = projection_from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(await run_in_executor(extract_batch_data, batch_name, projection))
+
+@app.route("/get-batch-data2", methods=["GET"])
+async def get_batch_data2():
+    """
+    Fetch all patient conditions of a batch; parsing runs in an executor.
+    """
+    batch_name = request.args.get("batch_name", "")
+    if not batch_name:
+        return jsonify({"error": "Missing batch_name"}), 400
+
+    try:
+        projection = projection_from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    source = "index" if request.args.get("source") == "index" else "parse"
+    return jsonify(await run_in_executor(extract_batch_data2, batch_name, source, projection)), 200
+
+@app.route("/pool-stats", methods=["GET"])
+async def get_pool_stats():
+    """
+    Reports the MongoDB connection pool counters of this worker.
+    """
+    return jsonify(pool_stats()), 200
+
+@app.route("/metrics", methods=["GET"])
+async def get_metrics():
+    """
+    Prometheus metrics of this worker process.
+    """
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+if __name__ == '__main__':
+    app.run(host='0.0.0.0', port=5000)
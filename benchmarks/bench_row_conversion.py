@@ -0,0 +1,108 @@
+"""
+Microbenchmark: column-wise condition rows vs the old df.iterrows() loop.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_row_conversion --rows 20000
+"""
+import argparse
+import json
+import time
+import numpy as np
+import pandas as pd
+from services.workbook_parser import frame_to_conditions
+
+
+def legacy_frame_to_conditions(df, sheet_name):
+    """
+    The original per-row conversion, kept here as the reference output.
+    """
+    conditions = []
+    for _, row in df.iterrows():
+        json_object = {
+            "Condition": sheet_name if sheet_name in ["Pathogenic Variants", "Conflicting Variants"] else row.get("Condition", None),
+            "Headings": sheet_name if sheet_name in ["Pathogenic Variants", "Conflicting Variants"] else row.get("Headings", None),
+            "subtype_cond": sheet_name,
+            "Gene Name": row.get("Gene", None),
+            "Gene Score": row.get("Gene Score", None),
+            "rsID": row.get("rsID", None),
+            "Lit": row.get("Literature", None),
+            "ref": row.get("REF", None),
+            "alt": row.get("ALT", None),
+            "CH": row.get("CHROM", None),
+            "POS": row.get("POS", None),
+            "Zygosity": row.get("Zygosity", None),
+            "Consequence": row.get("Consequence", None),
+            "Conseq score": row.get("Consequence score", None),
+            "IMPACT": row.get("IMPACT", None),
+            "IMPACT score": row.get("IMPACT score", None),
+            "ClinVar CLNDN": row.get("ClinVar CLNDN", None),
+            "Clinical consequence": row.get("Clinical consequence", None),
+            "clin sig": row.get("ClinVar CLNSIG", None),
+            "Variant type": row.get("Variant type", None)
+        }
+        json_object = {key: (None if pd.isna(value) or value == np.nan else value) for key, value in json_object.items()}
+        conditions.append(json_object)
+    return conditions
+
+
+def make_sheet(rows, nan_ratio=0.2, seed=0):
+    """
+    Builds a sheet shaped like a patient workbook after column renaming.
+    """
+    rng = np.random.default_rng(seed)
+
+    def sprinkle(values):
+        values = pd.Series(values, dtype=object)
+        values[rng.random(rows) < nan_ratio] = np.nan
+        return values
+
+    return pd.DataFrame({
+        "Headings": sprinkle(rng.choice(["Type 2 Diabetes", "Insulin Resistance", "Obesity Risk"], rows)),
+        "Condition": sprinkle(rng.choice(["Condition A", "Condition B", "Condition C"], rows)),
+        "Gene": rng.choice(["TCF7L2", "PPARG", "KCNJ11", "FTO"], rows),
+        "Gene Score": np.where(rng.random(rows) < nan_ratio, np.nan, rng.random(rows)),
+        "rsID": [f"rs{100000 + i}" for i in range(rows)],
+        "Literature": sprinkle(rng.integers(0, 50, rows)),
+        "REF": rng.choice(list("ACGT"), rows),
+        "ALT": rng.choice(list("ACGT"), rows),
+        "CHROM": rng.integers(1, 23, rows),
+        "POS": rng.integers(1, 250_000_000, rows),
+        "Zygosity": rng.choice(["Heterozygous", "Homozygous"], rows),
+        "Consequence": rng.choice(["missense_variant", "intron_variant"], rows),
+        "Consequence score": rng.random(rows),
+        "IMPACT": rng.choice(["HIGH", "MODERATE", "LOW", "MODIFIER"], rows),
+        "IMPACT score": rng.integers(1, 5, rows),
+        "ClinVar CLNDN": sprinkle(rng.choice(["not_provided", "Diabetes_mellitus"], rows)),
+        "ClinVar CLNSIG": sprinkle(rng.choice(["Pathogenic", "Benign", "Uncertain_significance"], rows)),
+    })
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    df = make_sheet(args.rows)
+    for sheet_name in ["Diabetes", "Pathogenic Variants"]:
+        legacy_time, legacy = best_of(lambda: legacy_frame_to_conditions(df, sheet_name), args.repeat)
+        new_time, new = best_of(lambda: frame_to_conditions(df, sheet_name), args.repeat)
+
+        if json.dumps(legacy, default=str) != json.dumps(new, default=str):
+            raise SystemExit(f"❌ Output mismatch on sheet '{sheet_name}'")
+
+        print(f"{sheet_name:<20} rows={args.rows} iterrows={legacy_time * 1000:.1f}ms "
+              f"columnar={new_time * 1000:.1f}ms speedup={legacy_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
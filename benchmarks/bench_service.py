@@ -0,0 +1,230 @@
+"""
+End-to-end service benchmark on synthetic batches.
+
+Loads generated workbooks into a GridFS stand-in (mongomock by default, or a
+local mongod with --mongo-uri) and measures workbook parsing, both batch-data
+extractors, file serving and status polling at several batch sizes.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_service --sizes 1,5,20 --save-baseline
+    python -m benchmarks.bench_service --sizes 1,5,20          # compare
+"""
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from benchmarks.workbook_generator import WorkbookPool, load_batch
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def use_stand_in(mongo_uri=None):
+    """
+    Points the shared client at a local mongod, or at mongomock (with the
+    GridFS and $unionWith support the routes need) when no URI is given.
+    The benchmark database (MONGO_DB_NAME, set by main) is dropped first.
+    """
+    import mongo_connection
+
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+    else:
+        try:
+            import mongomock
+            import mongomock.aggregate
+            import mongomock.gridfs
+        except ImportError:
+            raise SystemExit("❌ Install mongomock or pass --mongo-uri mongodb://localhost:27017")
+
+        mongomock.gridfs.enable_gridfs_integration()
+        if "$unionWith" not in mongomock.aggregate._PIPELINE_HANDLERS:
+            def union_with(in_collection, database, options):
+                other = mongomock.aggregate.process_pipeline(
+                    list(database[options["coll"]].find()), database, options.get("pipeline", []), None
+                )
+                return list(in_collection) + list(other)
+            mongomock.aggregate._PIPELINE_HANDLERS["$unionWith"] = union_with
+        client = mongomock.MongoClient()
+
+    client.drop_database(mongo_connection.MONGO_DB_NAME)
+    mongo_connection.use_client(client)
+
+
+def percentile(sorted_values, q):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def measure(func, repeat, units=1, setup=None):
+    """
+    Runs func `repeat` times (after one warm-up) and returns p50/p99 latency
+    in ms and throughput in units per second.
+    """
+    timings = []
+    for attempt in range(repeat + 1):
+        if setup:
+            setup()
+        with contextlib.redirect_stdout(io.StringIO()):  # ✅ Keep service prints out of the timings
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+        if attempt:
+            timings.append(elapsed)
+
+    timings.sort()
+    return {
+        "p50_ms": round(percentile(timings, 50) * 1000, 3),
+        "p99_ms": round(percentile(timings, 99) * 1000, 3),
+        "throughput": round(units * len(timings) / sum(timings), 2) if sum(timings) else None,
+        "samples": len(timings)
+    }
+
+
+def run_suite(sizes, repeat, workbooks, pdf_size):
+    """
+    Returns {benchmark_name: stats} for every batch size.
+    """
+    import mongo_connection
+    from app import app  # Imported after the stand-in is installed
+    from services.excel_cache import excel_cache
+    from services.patient_service import extract_batch_data, extract_batch_data2, read_excel_from_gridfs
+    from services.workbook_parser import make_projection
+
+    db = mongo_connection.get_db()
+    fs = mongo_connection.get_fs()
+    client = app.test_client()
+    one_sheet = make_projection(sheets=["Diabetes"], fields=["Gene Name", "rsID", "clin sig"])
+    results = {}
+
+    for size in sizes:
+        batch_name = f"bench_{size}"
+        with contextlib.redirect_stdout(io.StringIO()):
+            patient_ids = load_batch(db, fs, batch_name, size, workbooks, pdf_size)
+        first = patient_ids[0]
+        excel_id = str(db["fs.files"].find_one({"filename": f"{first}.xlsx"}, {"_id": 1})["_id"])
+
+        def check(response):
+            if response.status_code not in (200, 206, 304):
+                raise RuntimeError(f"HTTP {response.status_code}: {response.get_data()[:200]!r}")
+
+        token = client.get(f"/get-report-status?batch_name={batch_name}").headers.get("X-Status-Token")
+        batches_etag = client.get("/get-batches").headers.get("ETag")
+        pdf_etag = client.get(f"/patient_files/{batch_name}/{first}/pdf").headers.get("ETag")
+
+        benchmarks = {
+            "read_excel_from_gridfs": (lambda: read_excel_from_gridfs(excel_id), 1, excel_cache.clear),
+            "read_excel_from_gridfs_cached": (lambda: read_excel_from_gridfs(excel_id), 1, None),
+            "extract_batch_data": (lambda: extract_batch_data(batch_name), size, excel_cache.clear),
+            "extract_batch_data2": (lambda: extract_batch_data2(batch_name), size, excel_cache.clear),
+            "extract_batch_data2_cached": (lambda: extract_batch_data2(batch_name), size, None),
+            "extract_batch_data2_one_sheet": (lambda: extract_batch_data2(batch_name, projection=one_sheet), size, excel_cache.clear),
+            "serve_pdf": (lambda: check(client.get(f"/patient_files/{batch_name}/{first}/pdf")), 1, None),
+            "serve_pdf_range": (lambda: check(client.get(
+                f"/patient_files/{batch_name}/{first}/pdf", headers={"Range": "bytes=0-65535"})), 1, None),
+            "serve_pdf_not_modified": (lambda: check(client.get(
+                f"/patient_files/{batch_name}/{first}/pdf", headers={"If-None-Match": pdf_etag or ""})), 1, None),
+            "serve_excel": (lambda: check(client.get(f"/f/{batch_name}/{first}")), 1, None),
+            "get_batches": (lambda: check(client.get("/get-batches")), 1, None),
+            "get_batches_not_modified": (lambda: check(client.get(
+                "/get-batches", headers={"If-None-Match": batches_etag or ""})), 1, None),
+            "report_status": (lambda: check(client.get(f"/get-report-status?batch_name={batch_name}")), 1, None),
+            "report_status_delta": (lambda: check(client.get(
+                f"/get-report-status?batch_name={batch_name}&since={token or ''}")), 1, None),
+        }
+
+        for name, (func, units, setup) in benchmarks.items():
+            key = f"{name}[patients={size}]"
+            results[key] = measure(func, repeat, units, setup)
+            print(f"{key:<48} p50={results[key]['p50_ms']:>9.2f}ms p99={results[key]['p99_ms']:>9.2f}ms "
+                  f"throughput={results[key]['throughput']}/s")
+
+    return results
+
+
+def compare(results, baseline, tolerance, min_delta_ms=0.5):
+    """
+    Returns the benchmarks whose p50 got slower than the baseline by more
+    than `tolerance` (a fraction) and by more than min_delta_ms, so jitter
+    on sub-millisecond routes is not reported.
+    """
+    regressions = []
+    for key, stats in results.items():
+        previous = baseline.get("results", {}).get(key)
+        if not previous or not previous.get("p50_ms"):
+            continue
+
+        change = stats["p50_ms"] / previous["p50_ms"] - 1
+        regressed = change > tolerance and stats["p50_ms"] - previous["p50_ms"] > min_delta_ms
+        marker = "❌" if regressed else "✅"
+        print(f"{marker} {key:<48} {previous['p50_ms']:>9.2f}ms -> {stats['p50_ms']:>9.2f}ms ({change:+.0%})")
+        if regressed:
+            regressions.append(key)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="1,5,20", help="Comma-separated batch sizes (patients)")
+    parser.add_argument("--rows", type=int, default=200, help="Rows per category sheet")
+    parser.add_argument("--nan-ratio", type=float, default=0.2)
+    parser.add_argument("--distinct", type=int, default=4, help="Distinct workbooks generated per run")
+    parser.add_argument("--pdf-size", type=int, default=200_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mongo-uri", default=os.environ.get("BENCH_MONGO_URI"), help="Local mongod instead of mongomock")
+    parser.add_argument("--db-name", default="genepowerx_bench", help="Scratch database, dropped on every run")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p50 slowdown before failing")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="Ignore p50 slowdowns smaller than this")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    os.environ["MONGO_DB_NAME"] = args.db_name  # ✅ Never touch the real database
+    os.environ["JOB_WORKERS"] = "0"  # No background job threads competing with the measurements
+    use_stand_in(args.mongo_uri)
+    workbooks = WorkbookPool(args.rows, args.nan_ratio, args.distinct)
+
+    results = run_suite(sizes, args.repeat, workbooks, args.pdf_size)
+    report = {
+        "meta": {
+            "created": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "store": "mongod" if args.mongo_uri else "mongomock",
+            "rows": args.rows,
+            "nan_ratio": args.nan_ratio,
+            "repeat": args.repeat
+        },
+        "results": results
+    }
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Synthetic patient workbooks shaped like the real genomics reports.
+
+Each workbook has one sheet per category of CATEGORY_ICON_MAPPING plus the
+Pathogenic/Conflicting Variants sheets, with the original column names
+(underscored, as exported) and a configurable share of empty cells.
+
+Usage (from the repository root):
+    python -m benchmarks.workbook_generator OUT_DIR --patients 20 --rows 200
+writes a batch folder that config/store.py can ingest.
+"""
+import argparse
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from services.workbook_parser import CATEGORY_ICON_MAPPING, VARIANT_SHEETS
+
+GENES = ["TCF7L2", "PPARG", "KCNJ11", "FTO", "APOE", "LDLR", "PCSK9", "MTHFR", "HFE", "BRCA1", "TP53", "COMT"]
+CONSEQUENCES = ["missense_variant", "intron_variant", "synonymous_variant", "stop_gained", "splice_region_variant"]
+CLNSIG = ["Pathogenic", "Likely_pathogenic", "Benign", "Likely_benign", "Uncertain_significance",
+          "Conflicting_interpretations_of_pathogenicity", "Benign/Likely_benign"]
+CLNDN = ["not_provided", "Diabetes_mellitus", "Hypercholesterolemia", "Hereditary_hemochromatosis"]
+
+
+def make_sheet(sheet_name, rows, nan_ratio=0.2, rng=None):
+    """
+    Builds one sheet with the exported column names. Category sheets get a
+    handful of Headings, each with a few Conditions.
+    """
+    rng = rng if rng is not None else np.random.default_rng(0)
+
+    def sprinkle(values):
+        values = pd.Series(values, dtype=object)
+        values[rng.random(rows) < nan_ratio] = np.nan
+        return values
+
+    columns = {}
+    if sheet_name not in VARIANT_SHEETS:
+        headings = [f"{sheet_name} Risk {i}" for i in range(1, 5)]
+        columns["Headings"] = rng.choice(headings, rows)
+        columns["Condition"] = sprinkle([f"{heading} - Condition {rng.integers(1, 4)}" for heading in columns["Headings"]])
+
+    columns.update({
+        "Gene": rng.choice(GENES, rows),
+        "Gene_Score": np.where(rng.random(rows) < nan_ratio, np.nan, rng.random(rows).round(3)),
+        "rsID": [f"rs{rng.integers(10_000, 99_999_999)}" for _ in range(rows)],
+        "Literature": sprinkle(rng.integers(0, 50, rows)),
+        "REF": rng.choice(list("ACGT"), rows),
+        "ALT": rng.choice(list("ACGT"), rows),
+        "CHROM": rng.integers(1, 23, rows),
+        "POS": rng.integers(1, 250_000_000, rows),
+        "Zygosity": rng.choice(["Heterozygous", "Homozygous"], rows),
+        "Consequence": rng.choice(CONSEQUENCES, rows),
+        "Consequence_score": rng.random(rows).round(3),
+        "IMPACT": rng.choice(["HIGH", "MODERATE", "LOW", "MODIFIER"], rows),
+        "IMPACT_score": rng.integers(1, 5, rows),
+        "ClinVar_CLNDN": sprinkle(rng.choice(CLNDN, rows)),
+        "Clinical_consequence": sprinkle(rng.choice(["risk_factor", "drug_response", "protective"], rows)),
+        "ClinVar_CLNSIG": sprinkle(rng.choice(CLNSIG, rows)),
+        "Variant_type": rng.choice(["SNV", "deletion", "insertion"], rows),
+    })
+    return pd.DataFrame(columns)
+
+
+def make_workbook(rows=200, nan_ratio=0.2, seed=0, variant_rows=None):
+    """
+    Returns the bytes of one patient workbook: every category sheet with
+    `rows` rows, and the variant sheets with `variant_rows` (default rows // 4).
+    """
+    rng = np.random.default_rng(seed)
+    variant_rows = max(1, rows // 4) if variant_rows is None else variant_rows
+    buffer = io.BytesIO()
+
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for sheet_name in CATEGORY_ICON_MAPPING:
+            sheet_rows = variant_rows if sheet_name in VARIANT_SHEETS else rows
+            make_sheet(sheet_name, sheet_rows, nan_ratio, rng).to_excel(writer, sheet_name=sheet_name, index=False)
+
+    return buffer.getvalue()
+
+
+def make_pdf(size=200_000, seed=0):
+    """
+    Returns PDF-like bytes of the given size (content is not a real PDF).
+    """
+    return b"%PDF-1.4\n" + np.random.default_rng(seed).bytes(max(0, size - 9))
+
+
+class WorkbookPool:
+    """
+    Generates `distinct` workbooks once and hands them out round-robin, so
+    large batches do not spend minutes in openpyxl.
+    """
+
+    def __init__(self, rows=200, nan_ratio=0.2, distinct=4, seed=0):
+        self.rows = rows
+        self.nan_ratio = nan_ratio
+        self.distinct = max(1, distinct)
+        self.seed = seed
+        self._workbooks = {}
+
+    def get(self, index):
+        seed = self.seed + index % self.distinct
+        if seed not in self._workbooks:
+            self._workbooks[seed] = make_workbook(self.rows, self.nan_ratio, seed)
+        return self._workbooks[seed]
+
+
+def load_batch(db, fs, batch_name, patients, workbooks, pdf_size=200_000):
+    """
+    Stores a synthetic batch the way config/store.py does: one Excel and one
+    PDF per patient in GridFS, the batch document, and a report/availability
+    status for part of the patients. Returns the patient ids.
+    """
+    patient_ids = [f"{batch_name}_P{index:04d}" for index in range(patients)]
+    pdf = make_pdf(pdf_size)
+    now = datetime.utcnow()
+    entries = []
+
+    for index, patient_id in enumerate(patient_ids):
+        content = workbooks.get(index)
+        excel_id = fs.put(
+            content, filename=f"{patient_id}.xlsx", file_type="excel", batch=batch_name, patient_id=patient_id,
+            sha256=hashlib.sha256(content).hexdigest(), md5=hashlib.md5(content).hexdigest()
+        )
+        pdf_id = fs.put(pdf, filename=f"{patient_id}.pdf", file_type="pdf", batch=batch_name, patient_id=patient_id)
+        entries.append({"patient_id": patient_id, "files": {"excel": str(excel_id), "pdf": str(pdf_id)}})
+
+    from services.file_service import invalidate_batches  # Imports the app config, only when loading
+    from services.patient_store import save_patients
+    db["batches"].update_one({"batch_name": batch_name}, {"$set": {"patients_in_collection": True}}, upsert=True)
+    save_patients(batch_name, entries, database=db)
+    invalidate_batches(batch_name, database=db)
+
+    reports = [
+        {"batch": batch_name, "patient_id": patient_id, "report_data": [{"Condition": "Diabetes"}], "timestamp": now - timedelta(minutes=index)}
+        for index, patient_id in enumerate(patient_ids) if index % 2 == 0
+    ]
+    if reports:
+        db["submitted_reports"].insert_many(reports)
+    for index, patient_id in enumerate(patient_ids):
+        if index % 3 == 0:
+            db["availability_status"].update_one(
+                {"batch": batch_name, "patient_id": patient_id},
+                {"$set": {"available": index % 2 == 0, "updated_at": now - timedelta(minutes=index)}},
+                upsert=True
+            )
+
+    return patient_ids
+
+
+def write_batch_dir(out_dir, patients, workbooks, pdf_size=200_000):
+    """
+    Writes <out_dir>/<patient_id>/{<patient_id>.xlsx, <patient_id>.pdf} for ingestion with config/store.py.
+    """
+    batch_name = os.path.basename(os.path.normpath(out_dir))
+    pdf = make_pdf(pdf_size)
+
+    for index in range(patients):
+        patient_id = f"{batch_name}_P{index:04d}"
+        patient_dir = os.path.join(out_dir, patient_id)
+        os.makedirs(patient_dir, exist_ok=True)
+        with open(os.path.join(patient_dir, f"{patient_id}.xlsx"), "wb") as f:
+            f.write(workbooks.get(index))
+        with open(os.path.join(patient_dir, f"{patient_id}.pdf"), "wb") as f:
+            f.write(pdf)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic batch folder")
+    parser.add_argument("out_dir")
+    parser.add_argument("--patients", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--nan-ratio", type=float, default=0.2)
+    parser.add_argument("--distinct", type=int, default=4)
+    parser.add_argument("--pdf-size", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workbooks = WorkbookPool(args.rows, args.nan_ratio, args.distinct, args.seed)
+    write_batch_dir(args.out_dir, args.patients, workbooks, args.pdf_size)
+    print(f"✅ Wrote {args.patients} patients to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+
+# ✅ Parsed-workbook cache (services/excel_cache.py)
+EXCEL_CACHE_MAX_BYTES = int(os.environ.get("EXCEL_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+EXCEL_CACHE_DIR = os.environ.get("EXCEL_CACHE_DIR", "")  # Empty = memory tier only
+EXCEL_CACHE_DISK_MAX_BYTES = int(os.environ.get("EXCEL_CACHE_DISK_MAX_BYTES", 2 * 1024 * 1024 * 1024))  # Disk tier budget
+
+# ✅ Batch extraction engine (services/patient_service.py)
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", os.cpu_count() or 1))
+
+# ✅ MongoDB connection pool (mongo_connection.py)
+MONGO_URI = os.environ.get("MONGO_URI")  # Required, e.g. mongodb+srv://<user>:<password>@<cluster>/?retryWrites=true&w=majority
+MONGO_DB_NAME = os.environ.get("MONGO_DB_NAME", "Finish_db")
+MONGO_MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MONGO_MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MONGO_MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 60000))
+MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 10000))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000))
+MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get("MONGO_SOCKET_TIMEOUT_MS", 0)) or None
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 0)) or None
+
+# ✅ Streaming uploads (services/upload_service.py)
+UPLOAD_WORKERS = int(os.environ.get("UPLOAD_WORKERS", 4))  # Files written to GridFS concurrently
+UPLOAD_QUEUE_CHUNKS = int(os.environ.get("UPLOAD_QUEUE_CHUNKS", 16))  # 64 KB chunks buffered per file
+
+# ✅ Report submission write concern ("majority", or a number of nodes)
+REPORT_WRITE_CONCERN = os.environ.get("REPORT_WRITE_CONCERN", "majority")
+REPORT_WRITE_JOURNAL = os.environ.get("REPORT_WRITE_JOURNAL", "").lower() in ("1", "true", "yes") or None
+REPORT_BULK_MAX = int(os.environ.get("REPORT_BULK_MAX", 500))  # Reports accepted per /submit-reports call
+STATUS_TOKEN_OVERLAP_MS = int(os.environ.get("STATUS_TOKEN_OVERLAP_MS", 5000))  # since= polls re-read this window
+
+# ✅ Logging: request timing summaries are logged at INFO, per-workbook timings at DEBUG
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+# ✅ Arrow sidecars of Excel files (services/sidecar_service.py, needs pyarrow)
+SIDECAR_ENABLED = os.environ.get("SIDECAR_ENABLED", "1").lower() not in ("0", "false", "no")
+SIDECAR_DIR = os.environ.get("SIDECAR_DIR", os.path.join(tempfile.gettempdir(), "genepowerx-sidecars"))  # Local materialization
+
+# ✅ Response compression (services/compression.py); zstd needs the zstandard package
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", 1024))  # Smaller bodies are sent as-is
+COMPRESS_GZIP_LEVEL = int(os.environ.get("COMPRESS_GZIP_LEVEL", 3))
+COMPRESS_ZSTD_LEVEL = int(os.environ.get("COMPRESS_ZSTD_LEVEL", 3))
+
+# ✅ Patient JSON files (services/json_file_service.py): optionally stored gzip-compressed
+JSON_STORE_GZIP = os.environ.get("JSON_STORE_GZIP", "").lower() in ("1", "true", "yes")
+JSON_GZIP_MIN_BYTES = int(os.environ.get("JSON_GZIP_MIN_BYTES", 64 * 1024))
+
+# ✅ Background extraction jobs (services/job_service.py)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 2))  # Worker threads per web process, 0 = enqueue only
+JOB_POLL_SECONDS = float(os.environ.get("JOB_POLL_SECONDS", 2))
+JOB_STALE_SECONDS = int(os.environ.get("JOB_STALE_SECONDS", 300))  # Running jobs without a heartbeat are retried
+JOB_MAX_ATTEMPTS = int(os.environ.get("JOB_MAX_ATTEMPTS", 3))
+JOB_PREWARM = os.environ.get("JOB_PREWARM", "1").lower() not in ("0", "false", "no")  # Ingest schedules pre-warming
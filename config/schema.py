@@ -0,0 +1,181 @@
+import sys
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+# ✅ Every index the routes rely on, per collection (keys, or (keys, index options))
+INDEXES = {
+    "fs.files": [
+        [("filename", ASCENDING)],
+        [("patient_id", ASCENDING), ("batch", ASCENDING), ("file_type", ASCENDING), ("uploadDate", DESCENDING)],
+        [("sha256", ASCENDING)],
+        ([("sha256", ASCENDING), ("batch", ASCENDING), ("patient_id", ASCENDING)],
+         {"unique": True, "partialFilterExpression": {"sha256": {"$type": "string"}}}),  # One copy of a file per patient
+        [("sidecar_of", ASCENDING)],
+    ],
+    "ingest_checkpoints": [
+        [("batch", ASCENDING), ("patient_id", ASCENDING)],
+    ],
+    "batches": [
+        [("batch_name", ASCENDING)],
+    ],
+    "patients": [
+        ([("batch_name", ASCENDING), ("patient_id", ASCENDING)], {"unique": True}),
+    ],
+    "submitted_reports": [
+        [("batch", ASCENDING), ("patient_id", ASCENDING)],
+        [("batch", ASCENDING), ("timestamp", ASCENDING)],
+    ],
+    "availability_status": [
+        [("batch", ASCENDING), ("patient_id", ASCENDING)],
+        [("batch", ASCENDING), ("updated_at", ASCENDING)],
+    ],
+    "extraction_jobs": [
+        [("status", ASCENDING), ("created_at", ASCENDING)],
+        ([("dedup_key", ASCENDING)], {"unique": True, "partialFilterExpression": {"active": True}}),  # One live job per batch view
+        [("batch", ASCENDING), ("status", ASCENDING), ("fingerprint", ASCENDING)],
+    ],
+    "variants": [
+        [("file_id", ASCENDING), ("seq", ASCENDING)],
+        [("batch", ASCENDING), ("patient_id", ASCENDING)],
+        [("batch", ASCENDING), ("gene", ASCENDING)],
+        [("batch", ASCENDING), ("rsid", ASCENDING)],
+        [("batch", ASCENDING), ("sheet", ASCENDING)],
+        [("batch", ASCENDING), ("clnsig_terms", ASCENDING)],
+        # Cross-batch /variants filters (no batch_name)
+        [("gene", ASCENDING)],
+        [("rsid", ASCENDING)],
+        [("clnsig_terms", ASCENDING)],
+        [("sheet", ASCENDING)],
+        [("patient_id", ASCENDING)],
+    ],
+}
+
+# Representative query of each route: (route, collection, filter, sort)
+ROUTE_QUERIES = [
+    ("/patient_files", "fs.files", {"filename": "P1.pdf"}, None),
+    ("/json", "fs.files", {"filename": "P1_report.json", "batch": "B1", "patient_id": "P1"}, [("uploadDate", DESCENDING)]),
+    ("/f", "fs.files", {"patient_id": "P1", "batch": "B1", "file_type": "excel"}, [("uploadDate", DESCENDING)]),
+    ("/get-batch-data", "batches", {"batch_name": "B1"}, None),
+    ("/get-batch-data", "patients", {"batch_name": "B1", "patient_id": {"$gt": "P1"}}, [("patient_id", ASCENDING)]),
+    ("/get-report-status", "submitted_reports", {"batch": "B1"}, None),
+    ("/get-report-status", "availability_status", {"batch": "B1"}, None),
+    ("/update-availability", "availability_status", {"batch": "B1", "patient_id": "P1"}, None),
+    ("/get-batch-data2?source=index", "variants", {"file_id": "0"}, [("seq", ASCENDING)]),
+    ("/variants", "variants", {"batch": "B1", "gene": "BRCA1"}, None),
+    ("/variants?clnsig=", "variants", {"clnsig_terms": "pathogenic"}, [("_id", ASCENDING)]),
+    ("/variants?sheet=", "variants", {"sheet": "Diabetes"}, [("_id", ASCENDING)]),
+    ("/variants?patient_id=", "variants", {"patient_id": "P1"}, [("_id", ASCENDING)]),
+    ("/jobs", "extraction_jobs", {"status": "queued"}, [("created_at", ASCENDING)]),
+]
+
+def _declared(entry):
+    return entry if isinstance(entry, tuple) else (entry, {})
+
+def _index_key(keys):
+    return tuple((field, int(direction) if isinstance(direction, (int, float)) else direction) for field, direction in keys)
+
+def ensure_collections(db, collections=None):
+    """
+    Creates any declared collection that does not exist yet, with a single
+    catalog lookup. Run once at startup instead of on every write.
+    """
+    existing = set(db.list_collection_names())
+    created = []
+    for collection_name in collections or INDEXES:
+        if collection_name not in existing:
+            try:
+                db.create_collection(collection_name)
+                created.append(collection_name)
+            except CollectionInvalid:
+                pass  # Created meanwhile by another worker
+
+    if created:
+        print(f"✅ Created collections: {', '.join(created)}")
+    return created
+
+def _create_one_by_one(collection, models):
+    names = []
+    for model in models:
+        try:
+            names.extend(collection.create_indexes([model]))
+        except OperationFailure as e:
+            # e.g. a unique index over documents stored before it existed
+            print(f"❌ Could not create index {model.document['name']} on {collection.name}: {e}")
+    return names
+
+def ensure_indexes(db, collections=None):
+    """
+    Creates any declared index that is missing. Returns the created index
+    names per collection.
+    """
+    created = {}
+    for collection_name, declared in INDEXES.items():
+        if collections and collection_name not in collections:
+            continue
+
+        collection = db[collection_name]
+        existing = {_index_key(info["key"]) for info in collection.index_information().values()}
+        missing = [
+            IndexModel(keys, **options) for keys, options in map(_declared, declared) if _index_key(keys) not in existing
+        ]
+
+        if missing:
+            try:
+                created[collection_name] = collection.create_indexes(missing)
+            except OperationFailure:
+                created[collection_name] = _create_one_by_one(collection, missing)  # Keep the indexes that can be built
+            if created[collection_name]:
+                print(f"✅ Created indexes on {collection_name}: {', '.join(created[collection_name])}")
+
+    return created
+
+def index_usage(db):
+    """
+    Reports how often each index was used since the server started ($indexStats).
+    """
+    usage = {}
+    for collection_name in INDEXES:
+        stats = db[collection_name].aggregate([{"$indexStats": {}}])
+        usage[collection_name] = {entry["name"]: entry["accesses"]["ops"] for entry in stats}
+    return usage
+
+def _has_collection_scan(plan):
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collection_scan(value) for value in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collection_scan(value) for value in plan)
+    return False
+
+def find_collection_scans(db):
+    """
+    Explains every route query and returns the ones whose winning plan falls
+    back to a collection scan.
+    """
+    flagged = []
+    for route, collection_name, query, sort in ROUTE_QUERIES:
+        cursor = db[collection_name].find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        if _has_collection_scan(plan):
+            flagged.append({"route": route, "collection": collection_name, "query": query})
+    return flagged
+
+if __name__ == "__main__":
+    sys.path.insert(0, ".")
+    from mongo_connection import db
+
+    ensure_collections(db)
+    ensure_indexes(db)
+    for collection_name, indexes in index_usage(db).items():
+        for name, ops in indexes.items():
+            print(f"{collection_name}.{name}: {ops} ops")
+
+    scans = find_collection_scans(db)
+    for scan in scans:
+        print(f"❌ {scan['route']} scans {scan['collection']} for {scan['query']}")
+    if not scans:
+        print("✅ All route queries use an index")
+    sys.exit(1 if scans else 0)
@@ -1,69 +1,228 @@
 import os
-import pandas as pd
-import gridfs
+import sys
+import time
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from bson import ObjectId
-from mongoo_connection import db, fs  # ✅ Import MongoDB connection
+from gridfs.errors import FileExists
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))  # ✅ Allow root imports
+from mongo_connection import db, fs  # ✅ Import MongoDB connection
+from services.file_service import invalidate_batches
+from services.job_service import schedule_prewarm
+from services.json_file_service import prepare_json_file
+from services.patient_store import migrate_batch, upsert_patient as save_patient
+from services.variant_service import ensure_variant_indexes, index_workbook
+from services.sidecar_service import build_sidecar, current_sidecar, sidecars_enabled
+from services.workbook_parser import build_patient_data, read_sheets
 
 # Path to the new batch folder
 BASE_DIR = r"C:\Users\pavan\OneDrive\Desktop\complete -project22\frontend-project\GenePowerX-website\Batch4_Jan_2025"
 
-def store_new_batch():
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 8))  # Patients uploaded in parallel
+HASH_CHUNK_SIZE = 1024 * 1024
+
+FILE_TYPES = {".xlsx": "excel", ".xls": "excel", ".json": "json", ".pdf": "pdf"}
+
+checkpoint_collection = db["ingest_checkpoints"]
+
+def store_new_batch(base_dir=BASE_DIR, force=False):
     """
     Reads a single batch folder and adds it to MongoDB without overwriting existing batches.
+    Patients are uploaded in parallel, unchanged files are skipped by content hash and
+    finished patients are checkpointed with their file hashes, so a rerun only does
+    the remaining work and still picks up files that changed on disk.
     """
     batch_collection = db["batches"]
-    batch_name = os.path.basename(BASE_DIR)  # ✅ Get batch name dynamically
+    batch_name = os.path.basename(os.path.normpath(base_dir))  # ✅ Get batch name dynamically
+
+    result = batch_collection.update_one(
+        {"batch_name": batch_name}, {"$setOnInsert": {"patients_in_collection": True}}, upsert=True
+    )
+    if result.upserted_id is not None:
+        invalidate_batches(batch_name)  # ✅ New batch, cached /get-batches listings are stale
+    elif migrate_batch(batch_name):
+        invalidate_batches(batch_name)  # ✅ Older batch: move its embedded patients before adding more
+    ensure_variant_indexes()
+
+    checkpoints = {}
+    if not force:
+        checkpoints = {
+            c["patient_id"]: c for c in checkpoint_collection.find({"batch": batch_name, "done": True}, {"patient_id": 1, "hashes": 1})
+        }
+
+    patient_ids = sorted(
+        patient_id for patient_id in os.listdir(base_dir)  # ✅ Iterate through patient folders
+        if os.path.isdir(os.path.join(base_dir, patient_id))
+    )
+    print(f"📦 {batch_name}: {len(patient_ids)} patients, {len(checkpoints)} checkpointed (skipped if their files are unchanged)")
+
+    started = time.perf_counter()
+    totals = {"files": 0, "uploaded": 0, "skipped": 0, "bytes": 0, "unchanged": 0}
+
+    with ThreadPoolExecutor(max_workers=INGEST_WORKERS) as executor:
+        futures = {
+            executor.submit(ingest_patient, base_dir, batch_name, patient_id, checkpoints.get(patient_id)): patient_id
+            for patient_id in patient_ids
+        }
+
+        for count, future in enumerate(as_completed(futures), start=1):
+            patient_id = futures[future]
+            try:
+                stats = future.result()
+            except Exception as e:
+                print(f"❌ [{count}/{len(patient_ids)}] {patient_id}: {e}")
+                continue
+
+            for key in totals:
+                totals[key] += stats[key]
+            if stats["unchanged"]:
+                continue
+
+            elapsed = time.perf_counter() - started
+            print(f"✅ [{count}/{len(patient_ids)}] {patient_id}: {stats['uploaded']} uploaded, {stats['skipped']} unchanged "
+                  f"({totals['bytes'] / 1e6 / elapsed:.1f} MB/s, {count / elapsed:.1f} patients/s)")
+
+    prewarm = schedule_prewarm(batch_name)  # ✅ Web workers parse the batch before the first reviewer opens it
+    if prewarm:
+        print(f"🔥 Pre-warming queued as job {prewarm['_id']}")
 
-    existing_batch = batch_collection.find_one({"batch_name": batch_name})
+    return {
+        "message": f"Stored batch: {batch_name}",
+        "patients": len(patient_ids),
+        "resumed_past": totals["unchanged"],
+        **totals,
+        "seconds": round(time.perf_counter() - started, 2)
+    }
 
-    batch_data = {"batch_name": batch_name, "patients": []}
+def ingest_patient(base_dir, batch_name, patient_id, checkpoint=None):
+    """
+    Stores one patient folder, updates its entry in the batch and marks it done
+    with the hashes of its files. Skipped when the checkpoint holds the same hashes.
+    """
+    patient_path = os.path.join(base_dir, patient_id)
+    patient_info = {"patient_id": patient_id, "files": {}}
+    stats = {"files": 0, "uploaded": 0, "skipped": 0, "bytes": 0, "unchanged": 0}
 
-    for patient_id in os.listdir(BASE_DIR):  # ✅ Iterate through patient folders
-        patient_path = os.path.join(BASE_DIR, patient_id)
+    files = []
+    for file in sorted(os.listdir(patient_path)):  # ✅ Iterate through files
+        file_type = FILE_TYPES.get(os.path.splitext(file)[1].lower())
+        if file_type:
+            files.append((file, file_type, hash_file(os.path.join(patient_path, file))))
 
-        if os.path.isdir(patient_path):  # Ensure it's a folder
-            patient_info = {"patient_id": patient_id, "files": {}}
+    hashes = {file: digests[0] for file, _, digests in files}
+    if checkpoint is not None and checkpoint.get("hashes") == hashes:
+        stats["unchanged"] = 1  # ✅ Same files as when it was checkpointed
+        return stats
 
-            for file in os.listdir(patient_path):  # ✅ Iterate through files
-                file_path = os.path.join(patient_path, file)
+    for file, file_type, digests in files:
+        file_path = os.path.join(patient_path, file)
+        try:
+            file_id, uploaded = store_file_in_gridfs(file_path, file, file_type, batch_name, patient_id, digests)
+        except ValueError as e:
+            print(f"⚠️ {patient_id}/{file}: {e}, not stored")  # ✅ Invalid JSON is rejected at ingest
+            continue
+        patient_info["files"][file_type] = str(file_id)
 
-                # ✅ Store Excel in GridFS
-                if file.endswith(".xlsx") or file.endswith(".xls"):
-                    file_id = store_file_in_gridfs(file_path, file, "excel")
-                    patient_info["files"]["excel"] = str(file_id)
+        stats["files"] += 1
+        if uploaded:
+            stats["uploaded"] += 1
+            stats["bytes"] += os.path.getsize(file_path)
+        else:
+            stats["skipped"] += 1
 
-                # ✅ Store JSON in GridFS
-                elif file.endswith(".json"):
-                    file_id = store_file_in_gridfs(file_path, file, "json")
-                    patient_info["files"]["json"] = str(file_id)
+        if file_type == "excel":
+            prepare_workbook(file_path, file_id, file, batch_name, patient_id, uploaded)
 
-                # ✅ Store PDF in GridFS
-                elif file.endswith(".pdf"):
-                    file_id = store_file_in_gridfs(file_path, file, "pdf")
-                    patient_info["files"]["pdf"] = str(file_id)
+    upsert_patient(batch_name, patient_info)
+    checkpoint_collection.update_one(
+        {"batch": batch_name, "patient_id": patient_id},
+        {"$set": {"done": True, "files": patient_info["files"], "hashes": hashes, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+    return stats
 
-            batch_data["patients"].append(patient_info)
+def prepare_workbook(file_path, file_id, file_name, batch_name, patient_id, uploaded):
+    """
+    Writes the Arrow sidecar of a workbook and normalizes its rows into the
+    variants collection, reading the xlsx once for both. Work that is already
+    done for this content is skipped.
+    """
+    file_doc = db["fs.files"].find_one({"_id": file_id})
+    needs_index = uploaded or "variants_indexed" not in file_doc
+    needs_sidecar = sidecars_enabled() and (uploaded or not current_sidecar(file_doc))
+    if not (needs_index or needs_sidecar):
+        return
 
-    if existing_batch:
-        # ✅ If batch exists, append new patients to the existing batch
-        batch_collection.update_one(
-            {"batch_name": batch_name},
-            {"$push": {"patients": {"$each": batch_data["patients"]}}}
-        )
-    else:
-        # ✅ If batch does not exist, insert new batch
-        batch_collection.insert_one(batch_data)
+    with open(file_path, "rb") as f:
+        content = f.read()
+    sheets = read_sheets(content)
 
-    return {"message": f"Stored batch: {batch_name}"}
+    if needs_sidecar:
+        build_sidecar(file_doc, sheets=sheets)
+    if needs_index:
+        conditions = build_patient_data(sheets)["conditions"]
+        index_workbook(batch_name, patient_id, file_id, file_name, content, conditions=conditions)
 
-def store_file_in_gridfs(file_path, file_name, file_type):
+def upsert_patient(batch_name, patient_info):
+    """
+    Replaces the patient's document in the patients collection, or adds it if it is new.
     """
-    Stores a file (Excel, JSON, PDF) in GridFS and returns the file ID.
+    if save_patient(batch_name, patient_info):
+        invalidate_batches(batch_name)  # ✅ Only a new patient changes the directory
+
+def hash_file(file_path):
     """
+    Returns the (sha256, md5) hex digests of a file, read in 1 MB chunks.
+    """
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
     with open(file_path, "rb") as f:
-        file_id = fs.put(f, filename=file_name, file_type=file_type)
-    return file_id
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            md5.update(chunk)
+    return sha256.hexdigest(), md5.hexdigest()
+
+def store_file_in_gridfs(file_path, file_name, file_type, batch_name=None, patient_id=None, digests=None):
+    """
+    Stores a file (Excel, JSON, PDF) in GridFS and returns (file ID, uploaded).
+    A byte-identical file already stored for the same patient and batch is
+    reused (the unique (sha256, batch, patient_id) index also catches uploads
+    racing this one). JSON files are validated (ValueError if invalid) and may
+    be stored gzipped. Pass digests (sha256, md5) when the file was already hashed.
+    """
+    sha256, md5 = digests or hash_file(file_path)
+    key = {"sha256": sha256, "batch": batch_name, "patient_id": patient_id}
+
+    existing = db["fs.files"].find_one(key, {"_id": 1})
+    if existing:
+        return existing["_id"], False
+
+    file_id = ObjectId()
+    try:
+        if file_type == "json":
+            with open(file_path, "rb") as f:
+                content, metadata = prepare_json_file(f.read())
+            fs.put(
+                content, _id=file_id, filename=file_name, file_type=file_type, batch=batch_name, patient_id=patient_id,
+                sha256=sha256, md5=md5, **metadata
+            )
+        else:
+            with open(file_path, "rb") as f:
+                fs.put(
+                    f, _id=file_id, filename=file_name, file_type=file_type, batch=batch_name, patient_id=patient_id,
+                    sha256=sha256, md5=md5
+                )
+    except FileExists:  # Rejected by the unique index
+        db["fs.chunks"].delete_many({"files_id": file_id})  # ✅ Chunks of the rejected copy
+        existing = db["fs.files"].find_one(key, {"_id": 1})
+        if existing is None:
+            raise
+        return existing["_id"], False
+    return file_id, True
 
 if __name__ == "__main__":
-    result = store_new_batch()
+    args = [arg for arg in sys.argv[1:] if arg != "--force"]
+    result = store_new_batch(args[0] if args else BASE_DIR, force="--force" in sys.argv)
     print(result)
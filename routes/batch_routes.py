@@ -1,15 +1,37 @@
-from flask import Blueprint, jsonify
-from services.file_service import get_batches_with_files
+from flask import Blueprint, jsonify, request
+from services.file_service import get_batch_directory, get_batch_patients
 
 batch_routes = Blueprint('batch_routes', __name__)
 
+def _versioned(payload, version):
+    """
+    JSON response carrying the directory version as its ETag (304 when unchanged).
+    """
+    response = jsonify(payload)
+    response.set_etag(f"batches-{version}")
+    response.cache_control.no_cache = True  # ✅ Always revalidate, unchanged directories get a 304
+    return response.make_conditional(request)
+
 @batch_routes.route('/get-batches', methods=['GET'])
 def get_batches():
     """
-    Fetch batches with patient files.
+    Fetch batches with patient files (cached until the next ingest).
+    """
+    try:
+        version, batch_data = get_batch_directory()
+        return _versioned(batch_data, version)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@batch_routes.route('/get-batches/<batch_name>', methods=['GET'])
+def get_batch(batch_name):
+    """
+    Fetch the patient ids of one batch.
     """
     try:
-        batch_data = get_batches_with_files()
-        return jsonify(batch_data), 200
+        version, patient_ids = get_batch_patients(batch_name)
+        if patient_ids is None:
+            return jsonify({"error": f"Batch '{batch_name}' not found in database"}), 404
+        return _versioned({"batch_name": batch_name, "patients": patient_ids}, version)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
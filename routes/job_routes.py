@@ -0,0 +1,33 @@
+from flask import Blueprint, jsonify, request
+from services.job_service import get_job, job_status, result_file
+from services.json_file_service import send_json_file
+
+job_bp = Blueprint("job_routes", __name__)
+
+@job_bp.route("/jobs/<job_id>", methods=["GET"])
+def get_job_status(job_id):
+    """
+    Status and progress of a background extraction job.
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    return jsonify(job_status(job)), 200
+
+@job_bp.route("/jobs/<job_id>/result", methods=["GET"])
+def get_job_result(job_id):
+    """
+    Streams the stored result of a finished job (view=<key> for jobs with several views).
+    """
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Job '{job_id}' not found"}), 404
+    if job["status"] == "expired":
+        return jsonify({"error": "Result was replaced by a newer job", "status": job["status"]}), 410
+    if job["status"] != "done":
+        return jsonify(job_status(job)), 409
+
+    file_doc = result_file(job, request.args.get("view"))
+    if file_doc is None:
+        return jsonify({"error": "Unknown result view", "results": job_status(job)["results"]}), 404
+    return send_json_file(file_doc)
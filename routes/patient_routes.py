@@ -1,34 +1,155 @@
-from flask import Blueprint, request, jsonify, send_file
-import gridfs
-import io
-from mongo_connection import db, fs  # ✅ Import MongoDB connection
-from services.patient_service import extract_batch_data, extract_batch_data2
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from werkzeug.exceptions import HTTPException
+from mongo_connection import db  # ✅ Import MongoDB connection
+from services.patient_service import extract_batch_data, extract_batch_data2, iter_batch_page, projection_from_args
+from services.excel_cache import excel_cache
+from services.job_service import job_status, make_view, request_batch_view
+from services.json_file_service import send_json_file
+from services.metrics import stage
+from services.stream_service import open_gridfs_file, send_gridfs_file
 
 patient_bp = Blueprint("patient_routes", __name__)
 
+MAX_BATCH_PAGE = 100
+
 @patient_bp.route("/get-batch-data", methods=["GET"])
 def get_batch_data():
     """
     Fetch all patient data from a batch stored in MongoDB.
+    sheets=Diabetes,Obesity limits the parsed sheets. A stored job result of
+    the current workbooks is served when there is one; with async=1 a cold
+    batch is extracted by a background job (202 + job id) instead.
     """
     batch_name = request.args.get("batch_name", "") # Convert to uppercase
     if not batch_name:
         return jsonify({"error": "Missing batch_name"}), 400
 
-    batch_data = extract_batch_data(batch_name)
-    return jsonify(batch_data)
+    try:
+        projection = projection_from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    response, file_docs = stored_batch_view(batch_name, make_view("batch_data", projection=projection))
+    if response is not None:
+        return response
+
+    batch_data = extract_batch_data(batch_name, projection=projection, file_docs=file_docs)
+    with stage("serialize"):
+        return jsonify(batch_data)
 
 @patient_bp.route("/get-batch-data2", methods=["GET"])  # ✅ Added this route
 def get_batch_data2():
     """
     Fetch alternative patient data format from MongoDB.
+    sheets= and fields= (condition keys, e.g. fields=Gene Name,rsID) are
+    pushed down to the parser so only those sheets and columns are read.
+    limit= (1 to MAX_BATCH_PAGE patients) and after=<X-Next-Cursor> page
+    through the batch. Stored job results and async=1 work as in get_batch_data.
     """
     batch_name = request.args.get("batch_name", "")# Convert to uppercase
     if not batch_name:
         return jsonify({"error": "Missing batch_name"}), 400
 
-    batch_data = extract_batch_data2(batch_name)  # ✅ Calls extract_batch_data2
-    return jsonify(batch_data), 200  # ✅ Ensure HTTP 200 OK response
+    try:
+        projection = projection_from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    limit = None
+    if "limit" in request.args:
+        limit = request.args.get("limit", type=int)
+        if limit is None or limit < 1:
+            return jsonify({"error": "limit must be a positive integer"}), 400
+        limit = min(limit, MAX_BATCH_PAGE)
+    rows_per_line = None
+    if "rows_per_line" in request.args:
+        rows_per_line = request.args.get("rows_per_line", type=int)
+        if rows_per_line is None or rows_per_line < 1:
+            return jsonify({"error": "rows_per_line must be a positive integer"}), 400
+    after = request.args.get("after")
+    source = "index" if request.args.get("source") == "index" else "parse"
+    stream = request.args.get("format") == "ndjson" or request.accept_mimetypes.best == "application/x-ndjson"
+
+    if not (stream or limit or after):
+        response, file_docs = stored_batch_view(batch_name, make_view("batch_data2", source, projection))
+        if response is not None:
+            return response
+
+        batch_data = extract_batch_data2(batch_name, source=source, projection=projection, file_docs=file_docs)  # ✅ Calls extract_batch_data2
+        with stage("serialize"):
+            return jsonify(batch_data), 200  # ✅ Ensure HTTP 200 OK response
+
+    try:
+        page = iter_batch_page(batch_name, after=after, limit=limit, source=source, projection=projection)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if page is None:
+        return jsonify({"error": f"Batch '{batch_name}' not found in database"}), 404
+
+    workbooks, next_cursor = page
+    if not stream:
+        batch_data = {file_name: {"conditions": excel_data.get("conditions", [])} for file_name, excel_data in workbooks}
+        with stage("serialize"):
+            response = jsonify(batch_data)
+        if next_cursor:
+            response.headers["X-Next-Cursor"] = next_cursor
+        return response, 200
+
+    return Response(
+        stream_with_context(iter_ndjson_conditions(workbooks, next_cursor, rows_per_line)),
+        mimetype="application/x-ndjson"
+    )
+
+def stored_batch_view(batch_name, spec):
+    """
+    On a cold batch: streams a stored job result, or with ?async=1 queues a
+    job and answers 202 with its id and progress. Returns (response, None),
+    or (None, file_docs) when the response should be built inline (warm
+    batch, or no result without async=1) from the workbooks looked up here.
+    """
+    queue = request.args.get("async") == "1"
+    outcome = request_batch_view(batch_name, spec, enqueue=queue)
+    if outcome is None:
+        if not queue:
+            return None, None  # ✅ Inline extraction reports the missing batch as before
+        return (jsonify({"error": f"Batch '{batch_name}' not found in database"}), 404), None
+
+    kind, value = outcome
+    if kind == "result":
+        return send_json_file(value), None
+    if kind == "job":
+        response = jsonify(job_status(value))
+        response.status_code = 202
+        response.headers["Location"] = f"/jobs/{value['_id']}"
+        return response, None
+    return None, value
+
+def iter_ndjson_conditions(workbooks, next_cursor, rows_per_line=None):
+    """
+    Emits one NDJSON line per patient as soon as its workbook is parsed, or
+    one line per `rows_per_line` variant rows. The last line carries the
+    cursor of the next page.
+    """
+    for file_name, excel_data in workbooks:
+        conditions = excel_data.get("conditions", [])
+        if "error" in excel_data:
+            yield current_app.json.dumps({"file": file_name, "error": excel_data["error"]}) + "\n"
+        elif not rows_per_line:
+            yield current_app.json.dumps({"file": file_name, "conditions": conditions}) + "\n"
+        else:
+            for part, offset in enumerate(range(0, max(len(conditions), 1), rows_per_line)):
+                line = {"file": file_name, "part": part, "conditions": conditions[offset:offset + rows_per_line]}
+                yield current_app.json.dumps(line) + "\n"
+
+    yield current_app.json.dumps({"next": next_cursor}) + "\n"
+
+@patient_bp.route("/cache-stats", methods=["GET"])
+def get_cache_stats():
+    """
+    Reports hit/miss counters of the parsed-workbook cache.
+    """
+    return jsonify(excel_cache.stats()), 200
+
 @patient_bp.route("/patient_files/<batch_name>/<patient_id>/<file_type>", methods=["GET"])
 def serve_patient_file(batch_name, patient_id, file_type):
     """
@@ -55,11 +176,10 @@ def serve_patient_file(batch_name, patient_id, file_type):
         if not file_record:
             return jsonify({"error": "File not found"}), 404
 
-        file_id = file_record["_id"]
-        file_obj = fs.get(file_id)
-
-        # ✅ Display PDF in the browser instead of forcing download
-        return send_file(io.BytesIO(file_obj.read()), mimetype="application/pdf")
+        # ✅ Display PDF in the browser instead of forcing download, streamed with Range support
+        return send_gridfs_file(open_gridfs_file(file_record), mimetype="application/pdf")
 
+    except HTTPException:
+        raise  # ✅ e.g. 416 for an unsatisfiable Range, with its Content-Range header
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,42 @@
+from flask import Blueprint, request, jsonify
+from services.variant_service import build_variant_query, query_variants, query_variant_patients
+
+variant_bp = Blueprint("variant_routes", __name__)
+
+MAX_VARIANT_PAGE = 1000
+
+@variant_bp.route("/variants", methods=["GET"])
+def get_variants():
+    """
+    Queries the variant index across patients.
+    Filters: batch_name, patient_id, gene, rsid, sheet, clnsig. Paginated with limit/after.
+    """
+    query = build_variant_query(request.args)
+    if not query:
+        return jsonify({"error": "At least one filter is required"}), 400
+
+    limit = min(request.args.get("limit", 100, type=int), MAX_VARIANT_PAGE)
+
+    try:
+        variants, next_cursor = query_variants(query, limit=max(limit, 1), after=request.args.get("after"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+    return jsonify({"variants": variants, "next": next_cursor}), 200
+
+@variant_bp.route("/variants/patients", methods=["GET"])
+def get_variant_patients():
+    """
+    Lists the patients that carry a matching variant, e.g.
+    /variants/patients?batch_name=Batch4&gene=BRCA1&clnsig=pathogenic
+    """
+    query = build_variant_query(request.args)
+    if not query:
+        return jsonify({"error": "At least one filter is required"}), 400
+
+    try:
+        return jsonify({"patients": query_variant_patients(query)}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -0,0 +1,125 @@
+import json
+import time
+
+# ✅ Arrow IPC encoding of workbook sheets. Like workbook_parser, this module
+# has no MongoDB imports so it can run in the parse pool; pyarrow is optional
+# and only imported when a sidecar is written or read.
+
+SIDECAR_FORMAT = "arrow-ipc"
+SIDECAR_VERSION = 1
+ALIGNMENT = 64
+JSON_COLUMNS_KEY = b"genepowerx.json_columns"
+
+def arrow_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _json_value(value):
+    if hasattr(value, "item"):
+        return value.item()  # numpy scalars
+    raise TypeError(f"Cannot store {type(value).__name__} in a sidecar")
+
+def _sheet_table(df):
+    """
+    Converts one sheet to an Arrow table. Columns Arrow cannot type (mixed
+    numbers and text, as Excel often has) are stored as JSON text and decoded
+    back to the same Python values on load.
+    """
+    import pandas as pd
+    import pyarrow as pa
+
+    json_columns = []
+    columns = {}
+    for name in df.columns:
+        column = df[name]
+        try:
+            pa.array(column, from_pandas=True)
+            columns[str(name)] = column
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            json_columns.append(str(name))
+            columns[str(name)] = column.astype(object).map(
+                lambda value: None if pd.isna(value) else json.dumps(value, default=_json_value)
+            )
+
+    table = pa.Table.from_pandas(pd.DataFrame(columns), preserve_index=False)
+    if json_columns:
+        metadata = dict(table.schema.metadata or {})
+        metadata[JSON_COLUMNS_KEY] = json.dumps(json_columns).encode()
+        table = table.replace_schema_metadata(metadata)
+    return table
+
+def encode_sheets(sheets):
+    """
+    Encodes (sheet_name, DataFrame) pairs as consecutive Arrow IPC files in
+    one blob. Returns (blob, index) where index lists each sheet's name,
+    offset, length and row count. Raises ValueError if a sheet holds values
+    that cannot be stored faithfully.
+    """
+    import pyarrow as pa
+
+    blob = bytearray()
+    index = []
+    for sheet_name, df in sheets:
+        try:
+            table = _sheet_table(df)
+        except TypeError as e:
+            raise ValueError(f"Sheet '{sheet_name}': {e}")
+
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        data = sink.getvalue().to_pybytes()
+
+        index.append({"name": sheet_name, "offset": len(blob), "length": len(data), "rows": table.num_rows})
+        blob += data
+        blob += b"\0" * (-len(blob) % ALIGNMENT)  # ✅ Keep every sheet 64-byte aligned for zero-copy reads
+
+    return bytes(blob), index
+
+def read_sidecar_sheets(path, index, timings=None, projection=None):
+    """
+    Memory-maps a materialized sidecar and returns (sheet_name, DataFrame)
+    pairs in workbook order, limited to the sheets and columns of a projection.
+    """
+    import pyarrow as pa
+    from services.workbook_parser import display_name, needed_columns, wants_sheet
+
+    started = time.perf_counter()
+    columns = needed_columns(projection)
+    sheets = []
+    with pa.memory_map(path, "r") as source:
+        buffer = source.read_buffer()
+        for entry in index:
+            if not wants_sheet(projection, entry["name"]):
+                continue
+
+            table = pa.ipc.open_file(buffer.slice(entry["offset"], entry["length"])).read_all()
+            if columns is not None:
+                table = table.select([name for name in table.column_names if display_name(name) in columns])
+            df = table.to_pandas()
+
+            json_columns = (table.schema.metadata or {}).get(JSON_COLUMNS_KEY)
+            for name in json.loads(json_columns) if json_columns else []:
+                if name not in df.columns:
+                    continue
+                df[name] = df[name].map(lambda value: None if value is None else json.loads(value)).astype(object)
+
+            sheets.append((entry["name"], df))
+
+    if timings is not None:
+        timings["sidecar_load"] = timings.get("sidecar_load", 0) + time.perf_counter() - started
+    return sheets
+
+def parse_sidecar_timed(path, index, projection=None):
+    """
+    Process-pool entry point: builds patient data from a sidecar and returns
+    (patient_data, timings) like parse_workbook_timed.
+    """
+    from services.workbook_parser import build_patient_data
+
+    timings = {}
+    sheets = read_sidecar_sheets(path, index, timings, projection)
+    return build_patient_data(sheets, timings, projection), timings
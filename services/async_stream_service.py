@@ -0,0 +1,65 @@
+from datetime import timezone
+from quart import Response, request
+from werkzeug.datastructures import ContentRange, Headers
+from werkzeug.http import http_date, quote_etag
+from services.stream_service import gridfs_etag
+
+async def async_send_gridfs_file(grid_out, mimetype, as_attachment=False, download_name=None):
+    """
+    Async counterpart of send_gridfs_file for Motor GridOut objects: streams
+    the file chunk by chunk and honours Range, If-Range, If-None-Match and
+    If-Modified-Since.
+    """
+    await grid_out.open()
+    etag = gridfs_etag(grid_out)
+    length = grid_out.length
+    upload_date = grid_out.upload_date.replace(tzinfo=timezone.utc)
+
+    headers = Headers()
+    headers["ETag"] = quote_etag(etag)
+    headers["Last-Modified"] = http_date(upload_date)
+    headers["Accept-Ranges"] = "bytes"
+    headers["Cache-Control"] = "no-cache"
+    if download_name:
+        headers.set("Content-Disposition", "attachment" if as_attachment else "inline", filename=download_name)
+
+    # ✅ Repeated views: no body at all
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = bool(request.if_modified_since) and upload_date.replace(microsecond=0) <= request.if_modified_since
+    if not_modified:
+        return Response("", status=304, headers=headers)
+
+    start, end, status = 0, length, 200
+    # ✅ If-Range: only honour the range when the client's copy is current
+    if_range = request.if_range
+    if if_range.etag:
+        range_applies = if_range.etag == etag
+    elif if_range.date:
+        range_applies = upload_date.replace(microsecond=0) <= if_range.date
+    else:
+        range_applies = True
+
+    byte_range = request.range
+    if byte_range and range_applies:
+        bounds = byte_range.range_for_length(length)
+        if bounds is None:
+            return Response("", status=416, headers={"Content-Range": f"bytes */{length}"})
+        start, end = bounds
+        status = 206
+        headers["Content-Range"] = ContentRange("bytes", start, end, length).to_header()
+
+    headers["Content-Length"] = str(end - start)
+
+    async def body():
+        grid_out.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = await grid_out.read(min(grid_out.chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+    return Response(body(), status=status, headers=headers, mimetype=mimetype)
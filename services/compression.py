@@ -0,0 +1,93 @@
+import gzip
+from config.config import COMPRESS_GZIP_LEVEL, COMPRESS_MIN_BYTES, COMPRESS_ZSTD_LEVEL
+from services.metrics import stage
+
+# ✅ Negotiated response compression (zstd, else gzip) for JSON and text bodies.
+# File downloads, ranges and streamed responses (NDJSON) are left untouched.
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {"application/json", "text/plain", "text/csv", "text/html"}
+
+def available_encodings():
+    """
+    Content codings this process can produce, most preferred first.
+    """
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+def choose_encoding(accept_encodings):
+    """
+    Picks the best coding the client accepts (werkzeug Accept object), or None.
+    """
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress_bytes(data, encoding):
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=COMPRESS_ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0)
+
+def _wants_compression(response):
+    return (
+        response.status_code == 200
+        and response.mimetype in COMPRESSIBLE_MIMETYPES
+        and "Content-Encoding" not in response.headers
+    )
+
+def _apply(response, data, accept_encodings):
+    """
+    Replaces the body with its compressed form when that is worth it.
+    The ETag becomes weak, since the bytes differ from the identity body but
+    If-None-Match revalidation (a weak comparison) keeps producing 304s.
+    """
+    response.vary.add("Accept-Encoding")
+    encoding = choose_encoding(accept_encodings)
+    if encoding is None or len(data) < COMPRESS_MIN_BYTES:
+        return response
+
+    with stage("compress"):
+        body = compress_bytes(data, encoding)
+    if len(body) >= len(data):
+        return response
+
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+def init_app(app):
+    """
+    Compresses buffered Flask responses above COMPRESS_MIN_BYTES.
+    """
+    from flask import request
+
+    @app.after_request
+    def _compress(response):
+        if response.direct_passthrough or response.is_streamed or not _wants_compression(response):
+            return response
+        return _apply(response, response.get_data(), request.accept_encodings)
+
+    return app
+
+def init_async_app(app):
+    """
+    Same as init_app for the Quart app.
+    """
+    from quart import request
+
+    @app.after_request
+    async def _compress(response):
+        if not isinstance(response.response, response.data_body_class) or not _wants_compression(response):
+            return response
+        return _apply(response, await response.get_data(), request.accept_encodings)
+
+    return app
@@ -0,0 +1,187 @@
+import os
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from config.config import EXCEL_CACHE_DISK_MAX_BYTES, EXCEL_CACHE_MAX_BYTES, EXCEL_CACHE_DIR
+
+
+class ExcelCache:
+    """
+    Content-addressed cache for parsed workbooks.
+
+    Entries are keyed by the GridFS file _id plus its md5/length, so a
+    re-uploaded workbook never serves stale data. The memory tier is an LRU
+    bounded by a byte budget; the optional disk tier survives restarts and
+    is bounded by its own budget, evicting the least recently used files
+    (by mtime, which disk hits refresh).
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, max_bytes=EXCEL_CACHE_MAX_BYTES, cache_dir=EXCEL_CACHE_DIR, disk_max_bytes=EXCEL_CACHE_DISK_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir or None
+        self.disk_max_bytes = disk_max_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._bytes = 0
+        self._disk_bytes = 0  # Estimate; other processes share the directory
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_bytes = sum(size for _, size, _ in self._disk_files())
+
+    @staticmethod
+    def key_for(file_id, md5, length, upload_date=None, projection=""):
+        """
+        Builds the cache key for a GridFS file. Files stored without an md5
+        fall back to their upload date as the content marker. Projected parses
+        (see workbook_parser.projection_key) are cached under their own key.
+        """
+        marker = md5 or (upload_date.isoformat() if upload_date else "")
+        key = f"{file_id}:{marker}:{length}"
+        return f"{key}:{projection}" if projection else key
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        blob = self._read_disk(key)
+        if blob is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        value = pickle.loads(blob)
+        with self._lock:
+            self.disk_hits += 1
+        self._put_memory(key, value, len(blob))
+        return value
+
+    def contains(self, key):
+        """
+        True if the key is cached in either tier; does not count as a lookup.
+        """
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.cache_dir) and os.path.exists(self._disk_path(key))
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self._put_memory(key, value, len(blob))
+        self._write_disk(key, blob)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_tier": bool(self.cache_dir),
+                "disk_bytes": self._disk_bytes,
+                "disk_max_bytes": self.disk_max_bytes,
+            }
+
+    def _put_memory(self, key, value, size):
+        if size > self.max_bytes:
+            return  # Larger than the whole budget, keep it on disk only
+
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+
+            self._entries[key] = (value, size)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.pkl")
+
+    def _read_disk(self, key):
+        if not self.cache_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                blob = f.read()
+            os.utime(path)  # ✅ Marks the entry as recently used for eviction
+            return blob
+        except OSError:
+            return None
+
+    def _write_disk(self, key, blob):
+        if not self.cache_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(blob)
+            os.replace(tmp_path, path)  # ✅ Atomic, readers never see partial files
+        except OSError as e:
+            print(f"⚠️ Could not write workbook cache entry {path}: {e}")
+            return
+
+        with self._disk_lock:
+            self._disk_bytes += len(blob)
+            if self._disk_bytes > self.disk_max_bytes:
+                self._evict_disk()
+
+    def _disk_files(self):
+        """
+        Returns (path, size, mtime) of every cache file on disk.
+        """
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Evicted meanwhile by another process
+                files.append((entry.path, stat.st_size, stat.st_mtime))
+        return files
+
+    def _evict_disk(self):
+        """
+        Rescans the directory (other processes write to it too) and removes
+        the least recently used files until the tier is at 90% of its budget.
+        """
+        files = sorted(self._disk_files(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        for path, size, _ in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass  # Removed meanwhile by another process
+        self._disk_bytes = total
+
+
+excel_cache = ExcelCache()
@@ -1,20 +1,64 @@
 import os
+import threading
+from datetime import datetime
 # from config.sys_paths import BASE_DIR
 
 from mongo_connection import db  # ✅ Import MongoDB connection
+from services.patient_store import patient_directory
+
+# ✅ The batch/patient directory only changes when batches are ingested, so it is
+# cached per process and rebuilt when the version stamp in app_meta moves.
+# Writers to the batches collection call invalidate_batches().
+
+META_COLLECTION = "app_meta"
+BATCHES_VERSION_ID = "batches"
+
+_directory = {"version": None, "batches": {}}
+_directory_lock = threading.Lock()
 
 def get_batches_with_files():
     """
     Fetches batch data from MongoDB instead of local file system.
+    Patient ids come from the patients collection (see services/patient_store.py).
     """
-    batch_collection = db["batches"]
-    batches = {}
+    return patient_directory()
 
-    # ✅ Fetch all batch documents from MongoDB
-    for batch in batch_collection.find({}, {"_id": 0, "batch_name": 1, "patients.patient_id": 1}):
-        batch_name = batch["batch_name"] # Normalize batch name
-        patient_ids = [p["patient_id"] for p in batch.get("patients", [])]  # Extract patient IDs
-        batches[batch_name] = patient_ids  # Store batch data
+def batches_version():
+    """
+    Current version stamp of the batch directory (0 before the first write).
+    """
+    meta = db[META_COLLECTION].find_one({"_id": BATCHES_VERSION_ID}, {"version": 1})
+    return meta["version"] if meta else 0
 
-    return batches
+def invalidate_batches(batch_name=None, database=None):
+    """
+    Moves the version stamp after batches or their patient lists changed,
+    so every process rebuilds its cached directory on the next request.
+    """
+    (database if database is not None else db)[META_COLLECTION].update_one(
+        {"_id": BATCHES_VERSION_ID},
+        {"$inc": {"version": 1}, "$set": {"updated_at": datetime.utcnow(), "batch": batch_name}},
+        upsert=True
+    )
 
+def get_batch_directory():
+    """
+    Returns (version, {batch_name: [patient ids]}). Costs one point read of
+    the version stamp; the batches collection is only scanned after it changed.
+    """
+    version = batches_version()
+    if _directory["version"] == version:
+        return version, _directory["batches"]
+
+    with _directory_lock:
+        if _directory["version"] != version:
+            _directory["batches"] = get_batches_with_files()
+            _directory["version"] = version
+        return version, _directory["batches"]
+
+def get_batch_patients(batch_name):
+    """
+    Returns (version, patient ids of one batch), or (version, None) if the batch is unknown.
+    """
+    version, batches = get_batch_directory()
+    return version, batches.get(batch_name)
@@ -0,0 +1,312 @@
+import argparse
+import gzip
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from mongo_connection import db, fs  # ✅ Import MongoDB connection
+from config.config import (
+    COMPRESS_GZIP_LEVEL, JOB_MAX_ATTEMPTS, JOB_POLL_SECONDS, JOB_PREWARM, JOB_STALE_SECONDS, JOB_WORKERS
+)
+from services.json_provider import dumps_bytes
+from services.metrics import log_event
+from services.patient_service import (
+    batch_data2_view, batch_data_view, batch_excel_files, batch_fingerprint, is_batch_cached, iter_batch_workbooks
+)
+from services.workbook_parser import make_projection, projection_key
+
+# ✅ Batch extraction as background jobs. Jobs live in the extraction_jobs
+# collection, so they survive restarts and any web process (or the CLI worker
+# below) can run them. Results are stored gzipped in GridFS and reused until a
+# workbook of the batch changes.
+
+VIEWS = {"batch_data": batch_data_view, "batch_data2": batch_data2_view}
+
+logger = logging.getLogger(__name__)
+
+jobs_collection = db["extraction_jobs"]
+
+def make_view(view, source="parse", projection=None):
+    """
+    Describes one batch-data response a job produces.
+    """
+    sheets, fields = projection if projection is not None else (None, None)
+    return {"view": view, "source": source, "sheets": list(sheets or []), "fields": list(fields or [])}
+
+def view_projection(spec):
+    return make_projection(spec["sheets"], spec["fields"])
+
+def view_key(spec):
+    """
+    Short, field-name-safe key of a view (sheet names may contain dots).
+    """
+    raw = f"{spec['view']}|{spec['source']}|{projection_key(view_projection(spec))}"
+    return hashlib.sha1(raw.encode()).hexdigest()[:16]
+
+def enqueue_job(batch_name, views, reason="request"):
+    """
+    Queues a job computing `views` of a batch and returns its document. While
+    a job for the same batch and views is queued or running, that job is
+    returned instead of a new one.
+    """
+    keys = [view_key(spec) for spec in views]
+    dedup_key = f"{batch_name}|{'+'.join(sorted(keys))}"
+
+    existing = jobs_collection.find_one({"dedup_key": dedup_key, "active": True})
+    if existing:
+        return existing
+
+    now = datetime.utcnow()
+    job = {
+        "batch": batch_name,
+        "views": views,
+        "view_keys": keys,
+        "dedup_key": dedup_key,
+        "reason": reason,
+        "status": "queued",
+        "active": True,
+        "progress": {"done": 0, "total": None},
+        "attempts": 0,
+        "created_at": now,
+        "updated_at": now
+    }
+    try:
+        job["_id"] = jobs_collection.insert_one(job).inserted_id
+    except DuplicateKeyError:
+        return jobs_collection.find_one({"dedup_key": dedup_key, "active": True}) or job  # Queued meanwhile elsewhere
+
+    _wakeup.set()
+    log_event(logger, logging.INFO, "job_queued", job_id=job["_id"], batch=batch_name, reason=reason)
+    return job
+
+def schedule_prewarm(batch_name):
+    """
+    Queues both batch-data views of a freshly ingested batch, so the first
+    reviewer gets stored results instead of waiting for the parse.
+    """
+    if not JOB_PREWARM:
+        return None
+    return enqueue_job(batch_name, [make_view("batch_data"), make_view("batch_data2")], reason="prewarm")
+
+def get_job(job_id):
+    if not ObjectId.is_valid(job_id):
+        return None
+    return jobs_collection.find_one({"_id": ObjectId(job_id)})
+
+def job_status(job):
+    """
+    Public view of a job document.
+    """
+    job_id = str(job["_id"])
+    progress = job.get("progress", {})
+    total = progress.get("total")
+    return {
+        "job_id": job_id,
+        "batch": job["batch"],
+        "views": [spec["view"] for spec in job["views"]],
+        "status": job["status"],
+        "progress": {
+            "done": progress.get("done", 0),
+            "total": total,
+            "percent": round(100 * progress.get("done", 0) / total, 1) if total else None
+        },
+        "error": job.get("error"),
+        "created_at": job.get("created_at"),
+        "finished_at": job.get("finished_at"),
+        "results": {key: f"/jobs/{job_id}/result?view={key}" for key in job.get("results", {})},
+        "status_url": f"/jobs/{job_id}"
+    }
+
+def find_result(batch_name, spec, fingerprint):
+    """
+    Returns the fs.files document of a stored result for this view computed
+    from the current workbooks, or None.
+    """
+    key = view_key(spec)
+    job = jobs_collection.find_one(
+        {"batch": batch_name, "status": "done", "fingerprint": fingerprint, "view_keys": key},
+        sort=[("finished_at", DESCENDING)]
+    )
+    if not job or key not in job.get("results", {}):
+        return None
+    return db["fs.files"].find_one({"_id": job["results"][key]})
+
+def result_file(job, key=None):
+    """
+    Returns the fs.files document of a job's result (its only view unless `key` is given).
+    """
+    results = job.get("results", {})
+    if key is None and len(results) == 1:
+        key = next(iter(results))
+    if key not in results:
+        return None
+    return db["fs.files"].find_one({"_id": results[key]})
+
+def request_batch_view(batch_name, spec, enqueue=True):
+    """
+    Decides how to answer a batch-data request. Returns ("inline", file_docs)
+    when the batch is warm (or read from the index), ("result", file_doc)
+    for a stored result of the current workbooks, ("job", job) after
+    queueing (only with `enqueue`, else "inline"), or None if the batch
+    does not exist. The inline file_docs save the extraction a second lookup.
+    """
+    file_docs = batch_excel_files(batch_name)
+    if file_docs is None:
+        return None
+    if spec["source"] == "index" or is_batch_cached(file_docs, view_projection(spec)):
+        return "inline", file_docs
+
+    file_doc = find_result(batch_name, spec, batch_fingerprint(file_docs))
+    if file_doc is not None:
+        return "result", file_doc
+    if not enqueue:
+        return "inline", file_docs
+    return "job", enqueue_job(batch_name, [spec])
+
+def claim_job(worker):
+    """
+    Atomically takes the oldest queued job, or a running one whose worker
+    stopped sending heartbeats (e.g. the process was restarted).
+    """
+    now = datetime.utcnow()
+    return jobs_collection.find_one_and_update(
+        {"$or": [
+            {"status": "queued"},
+            {"status": "running", "heartbeat": {"$lt": now - timedelta(seconds=JOB_STALE_SECONDS)}}
+        ]},
+        {"$set": {"status": "running", "worker": worker, "started_at": now, "heartbeat": now, "updated_at": now},
+         "$inc": {"attempts": 1}},
+        sort=[("created_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER
+    )
+
+def _update(job, **fields):
+    fields["updated_at"] = fields["heartbeat"] = datetime.utcnow()
+    jobs_collection.update_one({"_id": job["_id"]}, {"$set": fields})
+
+def _finish(job, status, **fields):
+    now = datetime.utcnow()
+    jobs_collection.update_one(
+        {"_id": job["_id"]},
+        {"$set": {"status": status, "finished_at": now, "updated_at": now, **fields}, "$unset": {"active": ""}}
+    )
+
+def store_result(job, spec, data):
+    """
+    Writes one computed view to GridFS as gzipped JSON, ready to be
+    streamed by json_file_service.send_json_file.
+    """
+    content = dumps_bytes(data)
+    return fs.put(
+        gzip.compress(content, compresslevel=COMPRESS_GZIP_LEVEL, mtime=0),
+        filename=f"{job['batch']}.{spec['view']}.json", file_type="job_result", job_id=job["_id"], batch=job["batch"],
+        content_type="application/json", json_validated=True, content_encoding="gzip", original_length=len(content)
+    )
+
+def _expire_older_results(job):
+    for old in jobs_collection.find({"dedup_key": job["dedup_key"], "status": "done", "_id": {"$ne": job["_id"]}}):
+        for file_id in old.get("results", {}).values():
+            fs.delete(file_id)
+        jobs_collection.update_one({"_id": old["_id"]}, {"$set": {"status": "expired"}, "$unset": {"results": ""}})
+
+def run_job(job):
+    """
+    Parses the batch once per distinct (source, projection) of the job's
+    views, reporting progress per workbook, and stores every view.
+    """
+    if job.get("attempts", 0) > JOB_MAX_ATTEMPTS:
+        _finish(job, "failed", error=f"Gave up after {JOB_MAX_ATTEMPTS} attempts")
+        return
+
+    started = time.perf_counter()
+    try:
+        file_docs = batch_excel_files(job["batch"])
+        if file_docs is None:
+            _finish(job, "failed", error=f"Batch '{job['batch']}' not found in database")
+            return
+
+        groups = {}
+        for spec in job["views"]:
+            groups.setdefault((spec["source"], projection_key(view_projection(spec))), []).append(spec)
+
+        total = len(file_docs) * len(groups)
+        fingerprint = batch_fingerprint(file_docs)
+        _update(job, fingerprint=fingerprint, progress={"done": 0, "total": total})
+
+        done = 0
+        results = {}
+        for specs in groups.values():
+            workbooks = []
+            for item in iter_batch_workbooks(file_docs, specs[0]["source"], view_projection(specs[0])):
+                workbooks.append(item)
+                done += 1
+                _update(job, progress={"done": done, "total": total})
+            for spec in specs:
+                results[view_key(spec)] = store_result(job, spec, VIEWS[spec["view"]](workbooks))
+
+        _finish(job, "done", results=results, progress={"done": total, "total": total})
+        _expire_older_results({**job, "results": results})
+        log_event(logger, logging.INFO, "job_done", job_id=job["_id"], batch=job["batch"],
+                  seconds=round(time.perf_counter() - started, 2), workbooks=len(file_docs))
+
+    except Exception as e:
+        _finish(job, "failed", error=str(e))
+        log_event(logger, logging.WARNING, "job_failed", job_id=job["_id"], batch=job["batch"], error=str(e))
+
+_wakeup = threading.Event()
+_workers = {"pid": None, "threads": []}
+_workers_lock = threading.Lock()
+
+def _worker_loop(worker):
+    while True:
+        try:
+            job = claim_job(worker)
+        except Exception as e:
+            log_event(logger, logging.WARNING, "job_claim_failed", worker=worker, error=str(e))
+            job = None
+
+        if job is None:
+            _wakeup.wait(JOB_POLL_SECONDS)
+            _wakeup.clear()
+            continue
+        run_job(job)
+
+def start_job_workers(_db=None, count=JOB_WORKERS):
+    """
+    Starts the worker threads of this process once (again after a fork).
+    Usable as a mongo_connection.on_connect callback.
+    """
+    with _workers_lock:
+        if _workers["pid"] == os.getpid() or count <= 0:
+            return _workers["threads"]
+
+        _workers["pid"] = os.getpid()
+        _workers["threads"] = []
+        for index in range(count):
+            worker = f"{socket.gethostname()}:{os.getpid()}:{index}"
+            thread = threading.Thread(target=_worker_loop, args=(worker,), name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            _workers["threads"].append(thread)
+        return _workers["threads"]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run extraction job workers, or queue pre-warming for a batch")
+    parser.add_argument("--batch", help="Queue pre-warming of this batch and exit")
+    parser.add_argument("--workers", type=int, default=max(1, JOB_WORKERS))
+    args = parser.parse_args()
+
+    if args.batch:
+        job = enqueue_job(args.batch, [make_view("batch_data"), make_view("batch_data2")], reason="cli")
+        print(f"✅ Job {job['_id']} ({job['status']}) for batch {args.batch}")
+    else:
+        logging.basicConfig(level=logging.INFO)
+        print(f"🚀 Running {args.workers} job workers (Ctrl+C to stop)")
+        start_job_workers(count=args.workers)
+        while True:
+            time.sleep(3600)
@@ -0,0 +1,115 @@
+import gzip
+import json
+import zlib
+from pymongo import DESCENDING
+from flask import current_app, request
+from mongo_connection import db  # ✅ Import MongoDB connection
+from config.config import JSON_GZIP_MIN_BYTES, JSON_STORE_GZIP
+from services.metrics import record_gridfs_read
+from services.stream_service import gridfs_etag, open_gridfs_file, send_gridfs_file
+
+# ✅ Patient JSON documents are validated once when they are stored and then
+# served straight from GridFS chunks, never parsed or re-serialized per request.
+# Large ones can be stored gzip-compressed (content_encoding "gzip").
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def is_valid_json(content):
+    try:
+        if orjson is not None:
+            try:
+                orjson.loads(content)
+                return True
+            except orjson.JSONDecodeError:
+                pass  # Retry leniently (NaN literals, huge ints), like the JSON provider
+        json.loads(content)
+        return True
+    except (ValueError, UnicodeDecodeError):
+        return False
+
+def prepare_json_file(content):
+    """
+    Validates JSON bytes and returns (bytes to store, extra GridFS metadata).
+    Raises ValueError if the content is not valid JSON.
+    """
+    if not is_valid_json(content):
+        raise ValueError("Not a valid JSON document")
+
+    metadata = {"json_validated": True, "content_type": "application/json"}
+    if JSON_STORE_GZIP and len(content) >= JSON_GZIP_MIN_BYTES:
+        compressed = gzip.compress(content, mtime=0)
+        if len(compressed) < len(content):
+            metadata.update(content_encoding="gzip", original_length=len(content))
+            return compressed, metadata
+    return content, metadata
+
+def find_json_file(batch_id, patient_id, file_type):
+    """
+    Returns the newest fs.files document of a patient's JSON file in a batch.
+    Files stored before batch metadata existed are still found by filename.
+    """
+    filename = f"{patient_id}_{file_type}.json"
+    files = db["fs.files"]
+    file_doc = files.find_one(
+        {"filename": filename, "batch": batch_id, "patient_id": patient_id}, sort=[("uploadDate", DESCENDING)]
+    )
+    if file_doc is None:
+        file_doc = files.find_one({"filename": filename, "batch": {"$exists": False}}, sort=[("uploadDate", DESCENDING)])
+    return file_doc
+
+def validate_stored_json(file_doc):
+    """
+    One-time check of a file stored before validation at ingest: reads and
+    validates it, then flags it so later requests stream it directly.
+    """
+    grid_out = open_gridfs_file(file_doc)
+    content = grid_out.read()
+    record_gridfs_read(len(content), purpose="validate")
+    if file_doc.get("content_encoding") == "gzip":
+        content = gzip.decompress(content)
+    if not is_valid_json(content):
+        return False
+
+    db["fs.files"].update_one({"_id": file_doc["_id"]}, {"$set": {"json_validated": True}})
+    return True
+
+def _iter_gunzip(file_obj):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        for chunk in file_obj:
+            data = decompressor.decompress(chunk)
+            if data:
+                yield data
+        tail = decompressor.flush()
+        if tail:
+            yield tail
+    finally:
+        file_obj.close()
+
+def send_json_file(file_doc):
+    """
+    Streams a validated JSON file. Gzip-stored files are sent as-is to
+    clients that accept gzip and decompressed on the fly for the others.
+    """
+    file_obj = open_gridfs_file(file_doc)
+    if file_doc.get("content_encoding") != "gzip":
+        return send_gridfs_file(file_obj, mimetype="application/json")
+
+    if request.accept_encodings["gzip"]:
+        response = send_gridfs_file(file_obj, mimetype="application/json", content_encoding="gzip")
+        response.vary.add("Accept-Encoding")
+        return response
+
+    response = current_app.response_class(_iter_gunzip(file_obj), mimetype="application/json", direct_passthrough=True)
+    response.content_length = file_doc.get("original_length")
+    response.last_modified = file_obj.upload_date
+    response.set_etag(gridfs_etag(file_obj))
+    response.cache_control.no_cache = True
+    response.vary.add("Accept-Encoding")
+    response = response.make_conditional(request.environ)
+    if response.status_code == 200:
+        record_gridfs_read(file_obj.length, purpose="serve")
+    return response
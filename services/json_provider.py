@@ -0,0 +1,90 @@
+import json
+import math
+from datetime import date
+from flask.json.provider import DefaultJSONProvider, _default
+
+# ✅ Fast JSON for Flask and Quart (Quart reuses Flask's provider classes).
+# orjson is optional; without it the stdlib provider is used with the same
+# output rules, so NaN and numpy scalars never leak into responses.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _default_value(value):
+    """
+    Values orjson (or json) does not serialize natively. Datetimes keep
+    Flask's HTTP-date format so existing clients see the same strings.
+    """
+    if isinstance(value, date):
+        if value != value:  # pandas NaT is a datetime that never equals itself
+            return None
+        return _default(value)
+    if hasattr(value, "item"):
+        return value.item()  # numpy scalars
+    return _default(value)
+
+def _scrub(value):
+    """
+    Stdlib fallback only: replaces NaN/Infinity (invalid JSON) with None.
+    """
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: _scrub(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_scrub(item) for item in value]
+    return value
+
+def _options(sort_keys=True, indent=False):
+    option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+    if sort_keys:
+        option |= orjson.OPT_SORT_KEYS
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    return option
+
+def _stdlib_dumps(obj, **kwargs):
+    kwargs.setdefault("default", _default_value)
+    return json.dumps(_scrub(obj), allow_nan=False, **kwargs)
+
+def dumps_bytes(obj, sort_keys=True, indent=False):
+    """
+    Serializes like the app's JSON provider, also outside a request
+    (e.g. background job results).
+    """
+    if orjson is None:
+        return _stdlib_dumps(obj, sort_keys=sort_keys, indent=2 if indent else None).encode()
+    return orjson.dumps(obj, default=_default_value, option=_options(sort_keys, indent))
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Serializes with orjson: numpy scalars and arrays natively and NaN/NaT
+    as null, so parsed workbook rows can be returned without a cleanup pass.
+    """
+
+    def _indent(self):
+        return (self.compact is None and self._app.debug) or self.compact is False
+
+    def dumps_bytes(self, obj, indent=False):
+        return dumps_bytes(obj, self.sort_keys, indent)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {"indent", "separators"}:
+            kwargs.setdefault("ensure_ascii", self.ensure_ascii)
+            kwargs.setdefault("sort_keys", self.sort_keys)
+            return _stdlib_dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, bool(kwargs.get("indent"))).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return json.loads(s, **kwargs)
+        try:
+            return orjson.loads(s)
+        except orjson.JSONDecodeError:
+            return json.loads(s)  # ✅ Lenient inputs (NaN literals, huge ints) still parse
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj, self._indent()) + b"\n", mimetype=self.mimetype)
@@ -0,0 +1,250 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pymongo import monitoring
+
+# ✅ In-process Prometheus metrics and per-request stage traces.
+# Recording is a lock plus a few additions, so it stays enabled in production.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+timing_logger = logging.getLogger("genepowerx.timing")
+
+_trace = ContextVar("request_trace", default=None)
+
+class Counter:
+    """
+    A monotonically increasing value per label set.
+    """
+
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value}")
+        return lines
+
+class Histogram:
+    """
+    Cumulative-bucket histogram per label set, rendered in Prometheus format.
+    """
+
+    def __init__(self, name, help_text, label_names=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._values = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, state in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, state):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + (bound,))} {cumulative}")
+                lines.append(f"{self.name}_bucket{_labels(self.label_names + ('le',), labels + ('+Inf',))} {state[-1]}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {state[-2]}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {state[-1]}")
+        return lines
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+REQUESTS = Counter("http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status"))
+REQUEST_ERRORS = Counter("http_request_errors_total", "HTTP requests answered with a 5xx status.", ("route", "method"))
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "HTTP request latency.", ("route", "method"))
+STAGE_SECONDS = Histogram("request_stage_duration_seconds", "Time spent per processing stage.", ("route", "stage"))
+MONGO_COMMANDS = Counter("mongo_commands_total", "MongoDB commands (round-trips) by command and outcome.", ("command", "outcome"))
+MONGO_COMMAND_SECONDS = Histogram("mongo_command_duration_seconds", "MongoDB command latency.", ("command",))
+GRIDFS_BYTES = Counter("gridfs_bytes_read_total", "Bytes read from GridFS.", ("purpose",))
+
+REGISTRY = [REQUESTS, REQUEST_ERRORS, REQUEST_SECONDS, STAGE_SECONDS, MONGO_COMMANDS, MONGO_COMMAND_SECONDS, GRIDFS_BYTES]
+
+def render_metrics():
+    """
+    Returns every metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def begin_request(route):
+    """
+    Starts the stage trace of the current request (or task).
+    """
+    trace = {"route": route, "started": time.perf_counter(), "stages": {}, "mongo_round_trips": 0, "gridfs_bytes": 0}
+    _trace.set(trace)
+    return trace
+
+def current_trace():
+    return _trace.get()
+
+def finish_request(method, status, trace=None):
+    """
+    Records the request counters and histograms and logs its timing summary.
+    Pass the trace when finishing outside the request's own context.
+    """
+    if trace is None:
+        trace = _trace.get()
+    if trace is None or trace.get("finished"):
+        return None
+    trace["finished"] = True
+    if _trace.get() is trace:
+        _trace.set(None)
+
+    route = trace["route"]
+    duration = time.perf_counter() - trace["started"]
+    REQUESTS.inc(route, method, status)
+    REQUEST_SECONDS.observe(duration, route, method)
+    if status >= 500:
+        REQUEST_ERRORS.inc(route, method)
+
+    if trace["stages"] and timing_logger.isEnabledFor(logging.INFO):
+        log_event(
+            timing_logger, logging.INFO, "request_timing",
+            route=route, method=method, status=status, duration_ms=round(duration * 1000, 2),
+            stages_ms={name: round(seconds * 1000, 2) for name, seconds in trace["stages"].items()},
+            mongo_round_trips=trace["mongo_round_trips"], gridfs_bytes=trace["gridfs_bytes"]
+        )
+    return trace
+
+def record_stage(name, seconds):
+    """
+    Adds time to a stage of the current request and to the stage histogram.
+    """
+    trace = _trace.get()
+    STAGE_SECONDS.observe(seconds, trace["route"] if trace else "", name)
+    if trace is not None:
+        trace["stages"][name] = trace["stages"].get(name, 0) + seconds
+
+@contextmanager
+def stage(name):
+    """
+    Times the enclosed block as one stage of the current request.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - started)
+
+def record_gridfs_read(size, purpose="parse"):
+    GRIDFS_BYTES.inc(purpose, amount=size)
+    trace = _trace.get()
+    if trace is not None:
+        trace["gridfs_bytes"] += size
+
+def log_event(logger, level, event, **fields):
+    """
+    Logs one structured (JSON) event line.
+    """
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({"event": event, **fields}, default=str))
+
+class CommandMetricsListener(monitoring.CommandListener):
+    """
+    Counts MongoDB round-trips and their latency, globally and per request.
+    Events fire on the thread that runs the command: pymongo runs it on the
+    request's own thread, and Motor runs it in its executor under a copy of
+    the calling task's context, so the trace is found in both cases.
+    """
+
+    def started(self, event):
+        trace = _trace.get()
+        if trace is not None:
+            trace["mongo_round_trips"] += 1
+
+    def succeeded(self, event):
+        MONGO_COMMANDS.inc(event.command_name, "ok")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        MONGO_COMMANDS.inc(event.command_name, "error")
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1e6, event.command_name)
+
+command_listener = CommandMetricsListener()
+
+class TracedBody:
+    """
+    Wraps a streamed Quart response body and finishes the request trace once
+    the body has been sent (or the client went away).
+    """
+
+    def __init__(self, body, method, status, trace):
+        self.body = body
+        self.method = method
+        self.status = status
+        self.trace = trace
+
+    async def __aenter__(self):
+        return await self.body.__aenter__()
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        try:
+            return await self.body.__aexit__(exc_type, exc_value, tb)
+        finally:
+            finish_request(self.method, self.status, self.trace)
+
+def init_app(app):
+    """
+    Traces every Flask request and serves GET /metrics.
+    """
+    from flask import Response, request
+
+    @app.before_request
+    def _begin_trace():
+        begin_request(request.url_rule.rule if request.url_rule else "unmatched")
+
+    @app.after_request
+    def _finish_trace(response):
+        if response.is_streamed or response.direct_passthrough:
+            # ✅ The body is produced after this hook: finish once it has been sent
+            method, status, trace = request.method, response.status_code, _trace.get()
+            response.call_on_close(lambda: finish_request(method, status, trace))
+            return response
+        finish_request(request.method, response.status_code)
+        return response
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        """
+        Prometheus metrics of this worker process.
+        """
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+    return app
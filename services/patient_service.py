@@ -1,187 +1,373 @@
-import pandas as pd
-import io
+import hashlib
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import gridfs
 from bson import ObjectId
-from mongo_connection import db, fs  # ✅ Import MongoDB connection
-import numpy as np
+from mongo_connection import db, fs, get_db  # ✅ Import MongoDB connection
+from config.config import EXTRACT_WORKERS
+from services.excel_cache import excel_cache
+from services.arrow_sidecar import parse_sidecar_timed
+from services.metrics import log_event, record_gridfs_read, record_stage, stage
+from services.patient_store import load_batch_patients
+from services.sidecar_service import discard_materialized, sidecar_for
+from services.workbook_parser import make_projection, parse_workbook_timed, project_patient_data, projection_key
+from services.variant_service import load_indexed_conditions
 
-def extract_batch_data(batch_name):
+# Fields GridOut needs to stream a file without a second lookup
+GRIDFS_FILE_FIELDS = {"_id": 1, "filename": 1, "length": 1, "chunkSize": 1, "uploadDate": 1, "md5": 1, "sha256": 1, "variants_indexed": 1, "sidecar": 1}
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_parse_executor():
     """
-    Fetches batch data from MongoDB and extracts patient Excel data.
-    Returns only subcategories (no conditions).
+    Returns the shared process pool used for workbook parsing, or None when
+    parsing should run inline (EXTRACT_WORKERS <= 1).
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None and EXTRACT_WORKERS > 1:
+            _executor = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS)
+        return _executor
+
+def replace_broken_executor(broken):
+    """
+    Shuts down a pool whose worker died (BrokenProcessPool) and returns a
+    fresh one. Callers racing on the same broken pool replace it only once.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+            broken.shutdown(wait=False, cancel_futures=True)
+            log_event(logger, logging.WARNING, "parse_pool_replaced", workers=EXTRACT_WORKERS)
+    return get_parse_executor()
+
+def _submit(executor, func, *args):
+    try:
+        return executor.submit(func, *args)
+    except BrokenProcessPool:
+        return replace_broken_executor(executor).submit(func, *args)  # ✅ Retry once on a new pool
+
+def projection_from_args(args):
+    """
+    Builds a projection from sheets= and fields= query arguments (comma
+    separated or repeated). Raises ValueError for unknown fields.
     """
-    batch_data = db["batches"].find_one({"batch_name": batch_name}, {"_id": 0, "patients": 1})
+    def values(name):
+        return [value for arg in args.getlist(name) for value in arg.split(",")]
 
+    return make_projection(values("sheets"), values("fields"))
 
-    if not batch_data:
+def extract_batch_data(batch_name, projection=None, file_docs=None):
+    """
+    Fetches batch data from MongoDB and extracts patient Excel data.
+    Returns only subcategories (no conditions).
+    A projection (workbook_parser.make_projection) limits the parsed sheets.
+    Pass file_docs (batch_excel_files) when the workbooks were already looked up.
+    """
+    workbooks = extract_batch_workbooks(batch_name, projection=projection, file_docs=file_docs)
+    if workbooks is None:
         return {"error": f"Batch '{batch_name}' not found in database"}
+    return batch_data_view(workbooks)
 
-    processed_data = {}
-
-    for patient in batch_data.get("patients", []):
-        if "excel" in patient["files"]:
-            file_id = patient["files"]["excel"]
-            
-            # ✅ Retrieve the filename from GridFS
-            file_record = db["fs.files"].find_one({"_id": ObjectId(file_id)})
-            if not file_record:
-                print(f"❌ No file found in GridFS with _id {file_id}")
-                continue  
-            
-            file_name = file_record["filename"]
-            print(f"✅ Fetching file: {file_name} ({file_id})")
-
-            # ✅ Read the Excel file from GridFS
-            excel_data = read_excel_from_gridfs(file_id)
-
-            # ✅ Fix: Only return subcategories (exclude conditions)
-            processed_data[file_name] = {
-                "subcategories": excel_data.get("subcategories", [])
-            }
+def batch_data_view(workbooks):
+    """
+    Builds the /get-batch-data response from (file_name, patient_data) pairs.
+    """
+    # ✅ Fix: Only return subcategories (exclude conditions)
+    processed_data = {
+        file_name: {"subcategories": excel_data.get("subcategories", [])}
+        for file_name, excel_data in workbooks
+    }
 
     return {"conditions": processed_data}  # ✅ Matches expected output structure
 
-def extract_batch_data2(batch_name):
+def extract_batch_data2(batch_name, source="parse", projection=None, file_docs=None):
     """
     Fetches batch data from MongoDB with only conditions.
     Returns conditions only (no subcategories).
+    With source="index", rows come from the variants collection where available.
+    A projection limits the sheets, their columns and the emitted keys.
+    Pass file_docs (batch_excel_files) when the workbooks were already looked up.
     """
-    batch_data = db["batches"].find_one({"batch_name": batch_name}, {"_id": 0, "patients": 1})
-
-
-    if not batch_data:
+    workbooks = extract_batch_workbooks(batch_name, source=source, projection=projection, file_docs=file_docs)
+    if workbooks is None:
         return {"error": f"Batch '{batch_name}' not found in database"}
+    return batch_data2_view(workbooks)
 
-    processed_data = {}
-
-    for patient in batch_data.get("patients", []):
-        if "excel" in patient["files"]:
-            file_id = patient["files"]["excel"]
-            
-            # ✅ Retrieve the filename from GridFS
-            file_record = db["fs.files"].find_one({"_id": ObjectId(file_id)})
-            if not file_record:
-                print(f"❌ No file found in GridFS with _id {file_id}")
-                continue  
-            
-            file_name = file_record["filename"]
-            print(f"✅ Fetching file: {file_name} ({file_id})")
-
-            # ✅ Read the Excel file from GridFS
-            excel_data = read_excel_from_gridfs(file_id)
-
-            # ✅ Fix: Only store conditions (no subcategories)
-            processed_data[file_name] = {
-                "conditions": excel_data.get("conditions", [])
-            }
+def batch_data2_view(workbooks):
+    """
+    Builds the /get-batch-data2 response from (file_name, patient_data) pairs.
+    """
+    # ✅ Fix: Only store conditions (no subcategories)
+    processed_data = {
+        file_name: {"conditions": excel_data.get("conditions", [])}
+        for file_name, excel_data in workbooks
+    }
 
     return processed_data  # ✅ Correct syntax and structure
 
-def read_excel_from_gridfs(file_id):
+def extract_batch_workbooks(batch_name, source="parse", projection=None, file_docs=None):
+    """
+    Parses every patient workbook of a batch once and returns
+    (file_name, patient_data) pairs in patient order, or None if the
+    batch does not exist. Both batch-data views are built from this.
+    With file_docs the batch is not looked up again.
+    """
+    if file_docs is not None:
+        return list(iter_batch_workbooks(file_docs, source, projection))
+
+    page = iter_batch_page(batch_name, source=source, projection=projection)
+    if page is None:
+        return None
+
+    workbooks, _ = page
+    return list(workbooks)
+
+def iter_batch_page(batch_name, after=None, limit=None, source="parse", projection=None):
+    """
+    Returns (workbooks, next_cursor) for one page of a batch, or None if the
+    batch does not exist. workbooks lazily yields (file_name, patient_data)
+    in patient_id order; the cursor is the patient_id to pass as `after`
+    for the next page. Only the patients of the page are read. Raises
+    ValueError for an `after` that is not a patient of the batch.
+    """
+    with stage("mongo_lookup"):
+        loaded = load_batch_patients(batch_name, after=after, limit=limit, with_excel=True)
+
+    if loaded is None:
+        return None
+
+    page, next_cursor = loaded
+
+    if source == "index":
+        return iter_indexed_workbooks(iter_batch_files(page), projection), next_cursor
+    return iter_parsed_workbooks(iter_batch_files(page), projection), next_cursor
+
+def iter_batch_workbooks(file_docs, source="parse", projection=None):
+    """
+    Same as the workbooks of iter_batch_page, for fs.files documents
+    already resolved by batch_excel_files.
+    """
+    if source == "index":
+        return iter_indexed_workbooks(iter_gridfs_files(file_docs), projection)
+    return iter_parsed_workbooks(iter_gridfs_files(file_docs), projection)
+
+def batch_excel_files(batch_name):
+    """
+    Returns the fs.files documents of a batch's workbooks in patient order,
+    or None if the batch does not exist.
+    """
+    loaded = load_batch_patients(batch_name, with_excel=True)
+    if loaded is None:
+        return None
+    return resolve_excel_files(loaded[0])[0]
+
+def batch_fingerprint(file_docs):
+    """
+    Identifies the workbook contents of a batch, so results computed from
+    them can be reused until a workbook is added or replaced.
+    """
+    digest = hashlib.sha256()
+    for file_doc in file_docs:
+        digest.update(f"{file_doc['_id']}:{file_doc.get('md5') or file_doc.get('sha256')}:{file_doc.get('length')}\n".encode())
+    return digest.hexdigest()
+
+def is_batch_cached(file_docs, projection=None):
+    """
+    True when every workbook is in the parse cache (as is or as a full
+    parse a projection can be derived from), i.e. the batch is warm.
+    """
+    for file_doc in file_docs:
+        key_args = (file_doc["_id"], file_doc.get("md5"), file_doc.get("length"), file_doc.get("uploadDate"))
+        if not excel_cache.contains(excel_cache.key_for(*key_args, projection=projection_key(projection))) and not (
+            projection is not None and excel_cache.contains(excel_cache.key_for(*key_args))
+        ):
+            return False
+    return True
+
+def resolve_excel_files(patients):
+    """
+    Resolves the GridFS documents of every patient Excel file in one $in
+    query. Returns (file_docs, missing, invalid): file_docs in patient
+    order, plus the ids that do not exist or are not valid ObjectIds.
+    """
+    file_ids = [patient["files"]["excel"] for patient in patients if "excel" in patient.get("files", {})]
+    invalid = [file_id for file_id in file_ids if not ObjectId.is_valid(file_id)]
+    object_ids = [ObjectId(file_id) for file_id in file_ids if ObjectId.is_valid(file_id)]
+
+    found = {}
+    if object_ids:
+        for file_doc in db["fs.files"].find({"_id": {"$in": object_ids}}, GRIDFS_FILE_FIELDS):
+            found[file_doc["_id"]] = file_doc
+
+    file_docs = [found[object_id] for object_id in object_ids if object_id in found]
+    missing = [str(object_id) for object_id in object_ids if object_id not in found]
+    return file_docs, missing, invalid
+
+def iter_batch_files(patients):
+    """
+    Yields (file_name, GridOut) for every patient that has an Excel file.
+    """
+    with stage("mongo_lookup"):
+        file_docs, missing, invalid = resolve_excel_files(patients)
+
+    if invalid:
+        log_event(logger, logging.WARNING, "invalid_excel_ids", file_ids=invalid)
+    if missing:
+        log_event(logger, logging.WARNING, "missing_excel_files", file_ids=missing)
+
+    yield from iter_gridfs_files(file_docs)
+
+def iter_gridfs_files(file_docs):
+    """
+    Yields (file_name, GridOut) for resolved fs.files documents.
+    """
+    for file_doc in file_docs:
+        log_event(logger, logging.DEBUG, "fetch_workbook", file=file_doc["filename"], file_id=file_doc["_id"], bytes=file_doc.get("length"))
+        # ✅ Reuse the resolved document so GridFS does not look the file up again
+        yield file_doc["filename"], gridfs.GridOut(get_db()["fs"], file_document=file_doc)
+
+def iter_parsed_workbooks(files, projection=None):
+    """
+    Yields (file_name, patient_data) in input order. Cached workbooks are
+    returned directly; the rest are downloaded here and parsed on the
+    process pool, with at most two workbooks per worker in flight.
+    """
+    executor = get_parse_executor()
+    window = max(1, EXTRACT_WORKERS) * 2
+    pending = deque()
+
+    for file_name, file_obj in files:
+        pending.append((file_name, _start_parse(executor, file_obj, projection)))
+        if len(pending) >= window:
+            yield _finish_parse(*pending.popleft())
+
+    while pending:
+        yield _finish_parse(*pending.popleft())
+
+def iter_indexed_workbooks(files, projection=None):
+    """
+    Yields (file_name, {"conditions": [...]}) from the variants collection,
+    parsing only the workbooks that were never indexed.
+    """
+    for file_name, file_obj in files:
+        if getattr(file_obj, "variants_indexed", None) is not None:
+            with stage("index_read"):
+                conditions = load_indexed_conditions(file_obj._id, projection)
+            yield file_name, {"conditions": conditions}
+        else:
+            yield _finish_parse(file_name, _start_parse(None, file_obj, projection))
+
+def _start_parse(executor, file_obj, projection=None):
+    """
+    Returns (cache_key, result, timings, file_obj, projection) where result is parsed
+    data, a Future, or an error dict. Workbooks with a current Arrow sidecar
+    are loaded from it instead of the xlsx. With a projection only the
+    requested sheets and columns are read.
+    """
+    timings = {}
+    try:
+        # ✅ Serve repeated reads of the same workbook from the parse cache
+        with stage("cache_lookup"):
+            key_args = (file_obj._id, file_obj.md5, file_obj.length, file_obj.upload_date)
+            cache_key = excel_cache.key_for(*key_args, projection=projection_key(projection))
+            patient_data = excel_cache.get(cache_key)
+            if patient_data is None and projection is not None:
+                # A cached full parse answers any projection without touching the file
+                full_data = excel_cache.get(excel_cache.key_for(*key_args))
+                patient_data = project_patient_data(full_data, projection) if full_data is not None else None
+        if patient_data is not None:
+            return None, patient_data, {"cached": True}, file_obj, projection
+
+        sidecar = sidecar_for(file_obj)
+        if sidecar is not None:
+            timings["source"] = "sidecar"
+            if executor is not None:
+                return cache_key, _submit(executor, parse_sidecar_timed, *sidecar, projection), timings, file_obj, projection
+            try:
+                return cache_key, parse_sidecar_timed(*sidecar, projection), timings, file_obj, projection
+            except Exception as e:
+                log_event(logger, logging.WARNING, "sidecar_load_failed", file_id=file_obj._id, error=str(e))
+                discard_materialized(file_obj)
+                timings = {}
+
+        return _start_xlsx_parse(executor, file_obj, cache_key, timings, projection)
+
+    except Exception as e:
+        return None, {"error": str(e)}, timings, file_obj, projection
+
+def _start_xlsx_parse(executor, file_obj, cache_key, timings, projection=None):
+    try:
+        read_started = time.perf_counter()
+        file_obj.seek(0)
+        content = file_obj.read()
+        timings["gridfs_read"] = time.perf_counter() - read_started
+        record_stage("gridfs_read", timings["gridfs_read"])
+        record_gridfs_read(len(content))
+
+        if executor is None:
+            return cache_key, parse_workbook_timed(content, projection), timings, file_obj, projection
+        return cache_key, _submit(executor, parse_workbook_timed, content, projection), timings, file_obj, projection
+
+    except Exception as e:
+        return None, {"error": str(e)}, timings, file_obj, projection
+
+def _finish_parse(file_name, started, retry=True):
+    cache_key, result, timings, file_obj, projection = started
+    try:
+        if hasattr(result, "result"):
+            with stage("parse_wait"):  # Time the request blocked on the pool
+                result = result.result()
+    except BrokenProcessPool as e:
+        if retry:
+            # A worker died (e.g. OOM-killed) with this workbook in flight: parse it once more on a new pool
+            log_event(logger, logging.WARNING, "parse_pool_broken", file=file_name)
+            return _finish_parse(file_name, _start_parse(get_parse_executor(), file_obj, projection), retry=False)
+        log_event(logger, logging.WARNING, "workbook_parse_failed", file=file_name, error=str(e))
+        return file_name, {"error": str(e)}
+    except Exception as e:
+        if timings.get("source") == "sidecar":
+            # ✅ A sidecar that fails to load never fails the request: parse the xlsx instead
+            log_event(logger, logging.WARNING, "sidecar_load_failed", file_id=file_obj._id, error=str(e))
+            discard_materialized(file_obj)
+            return _finish_parse(file_name, _start_xlsx_parse(None, file_obj, cache_key, {}, projection))
+        log_event(logger, logging.WARNING, "workbook_parse_failed", file=file_name, error=str(e))
+        return file_name, {"error": str(e)}
+
+    if isinstance(result, tuple):
+        result, parse_timings = result
+        for name, seconds in parse_timings.items():
+            record_stage(name, seconds)
+        timings.update(parse_timings)
+
+    if cache_key is not None:
+        excel_cache.put(cache_key, result)
+
+    log_event(
+        logger, logging.DEBUG, "workbook_timing", file=file_name,
+        **{f"{name}_ms": round(value * 1000, 2) if isinstance(value, float) else value for name, value in timings.items()}
+    )
+    return file_name, result
+
+def read_excel_from_gridfs(file_id, projection=None):
     """
-    Reads an Excel file from MongoDB GridFS and extracts patient data.
+    Reads an Excel file from MongoDB GridFS and extracts patient data,
+    optionally only the sheets and fields of a projection.
     """
     try:
         if not ObjectId.is_valid(file_id):
             return {"error": f"Invalid file_id: {file_id}"}
 
-        file_obj = fs.get(ObjectId(file_id))  
-        if not file_obj:
-            return {"error": f"No file found in GridFS with _id {file_id}"}
-
-        excel_data = pd.ExcelFile(io.BytesIO(file_obj.read()))
-        patient_data = {"subcategories": [], "conditions": []}
-
-        for sheet_name in excel_data.sheet_names:
-            df = excel_data.parse(sheet_name)
-
-            if df.empty:
-                continue  
-
-            # ✅ Extract "subcategories" (for extract_batch_data)
-            category_icon_mapping = {
-                "Pathogenic Variants": "Icons/PathogenicVariantsIcon.png",
-                "Conflicting Variants": "Icons/ConflictingVariantsIcon.png",
-                "Diabetes": "Icons/DiabetesIcon.png",
-                "High Blood Pressure": "Icons/High_Blood_PressureIcon.png",
-                "Cardiac Health": "Icons/Cardiac_HealthIcon.png",
-                "Cholesterol Disorders": "Icons/Cholesterol_DisordersIcon.png",
-                "Thyroid Disorders": "Icons/Thyroid_DisordersIcon.png",
-                "Parkinsons": "Icons/ParkinsonsIcon.png",
-                "Dementia": "Icons/DementiaIcon.png",
-                "Headaches": "Icons/HeadachesIcon.png",
-                "Allergies": "Icons/AllergiesIcon.png",
-                "Anemia": "Icons/AnemiaIcon.png",
-                "Fatty Liver": "Icons/Fatty_LiverIcon.png",
-                "Gall stones": "Icons/Gall_stonesIcon.png",
-                "Pancreatic Disorders": "Icons/Pancreatic_DisordersIcon.png",
-                "Gut Health": "Icons/Gut_HealthIcon.png",
-                "Gastritis": "Icons/GastritisIcon.png",
-                "Glomerular Diseases": "Icons/Glomerular_DiseasesIcon.png",
-                "Interstitial Nephritis": "Icons/Interstitial_NephritisIcon.png",
-                "Renal stones": "Icons/Renal_stonesIcon.png",
-                "Skin Health": "Icons/Skin_HealthIcon.png",
-                "Arthritis Degenerative Joint": "Icons/Arthritis_Degenerative_JointIcon.png",
-                "Mood Disorders": "Icons/Mood_DisordersIcon.png",
-                "Obesity": "Icons/ObesityIcon.png",
-                "Bone Joint health": "Icons/Bone_Joint_healthIcon.png",
-                "Muscular health": "Icons/Muscular_healthIcon.png"
-            }
-
-            icon_path = category_icon_mapping.get(sheet_name, "Icons/DefaultIcon.png")
-
-            # ✅ Fix: Special handling for Pathogenic Variants and Conflicting Variants
-            if sheet_name.lower() in ["pathogenic variants", "conflicting variants"]:
-                patient_data["subcategories"].append({
-                    "icon": icon_path,
-                    "name": sheet_name,
-                    "subcategories": [{"name": sheet_name, "subtype": [{"name": sheet_name}]}]
-                })
-            else:
-                if 'Headings' in df.columns and 'Condition' in df.columns:
-                    subcategory_obj = {
-                        "icon": icon_path,
-                        "name": sheet_name,
-                        "subcategories": [
-                            {
-                                "name": heading,
-                                "subtype": [{"name": cond} for cond in group['Condition'].dropna().unique()]
-                            }
-                            for heading, group in df.groupby('Headings')
-                        ]
-                    }
-                    patient_data["subcategories"].append(subcategory_obj)
-
-            # ✅ Extract "conditions" (for extract_batch_data2)
-            df.columns = [' '.join(col.split('_')) for col in df.columns]
-            for _, row in df.iterrows():
-                json_object = {
-                    "Condition": sheet_name if sheet_name in ["Pathogenic Variants", "Conflicting Variants"] else row.get("Condition", None),
-                    "Headings": sheet_name if sheet_name in ["Pathogenic Variants", "Conflicting Variants"] else row.get("Headings", None),
-                    "subtype_cond": sheet_name,
-                    "Gene Name": row.get("Gene", None),
-                    "Gene Score": row.get("Gene Score", None),
-                    "rsID": row.get("rsID", None),
-                    "Lit": row.get("Literature", None),
-                    "ref": row.get("REF", None),
-                    "alt": row.get("ALT", None),
-                    "CH": row.get("CHROM", None),
-                    "POS": row.get("POS", None),
-                    "Zygosity": row.get("Zygosity", None),
-                    "Consequence": row.get("Consequence", None),
-                    "Conseq score": row.get("Consequence score", None),
-                    "IMPACT": row.get("IMPACT", None),
-                    "IMPACT score": row.get("IMPACT score", None),
-                    "ClinVar CLNDN": row.get("ClinVar CLNDN", None),
-                    "Clinical consequence": row.get("Clinical consequence", None),
-                    "clin sig": row.get("ClinVar CLNSIG", None),
-                    "Variant type": row.get("Variant type", None)
-                }
-
-                json_object = {key: (None if pd.isna(value) or value == np.nan else value) for key, value in json_object.items()}
-                patient_data["conditions"].append(json_object)
-
-        return patient_data
-
+        file_obj = fs.get(ObjectId(file_id))
     except Exception as e:
         return {"error": str(e)}
+
+    return _finish_parse(None, _start_parse(None, file_obj, projection))[1]
@@ -0,0 +1,174 @@
+import argparse
+from datetime import datetime
+from pymongo import ASCENDING, UpdateOne
+from mongo_connection import db  # ✅ Import MongoDB connection
+
+# ✅ Patients are documents of their own in the patients collection, unique per
+# (batch_name, patient_id), so adding or reading one patient costs the same in
+# any batch. Batch documents written this way carry patients_in_collection;
+# batches ingested before keep their embedded "patients" array until migrated.
+
+PATIENTS_COLLECTION = "patients"
+PATIENT_ORDER = [("patient_id", ASCENDING)]
+
+def _database(database=None):
+    return database if database is not None else db
+
+def uses_collection(batch_doc):
+    return bool(batch_doc.get("patients_in_collection"))
+
+def upsert_patient(batch_name, patient_info, database=None):
+    """
+    Writes a patient's file ids. Returns True if the patient is new to the batch.
+    """
+    now = datetime.utcnow()
+    result = _database(database)[PATIENTS_COLLECTION].update_one(
+        {"batch_name": batch_name, "patient_id": patient_info["patient_id"]},
+        {"$set": {"files": patient_info.get("files", {}), "updated_at": now}, "$setOnInsert": {"created_at": now}},
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+def save_patients(batch_name, patients, database=None):
+    """
+    Upserts many patients of a batch with one unordered bulk write.
+    """
+    if not patients:
+        return 0
+    now = datetime.utcnow()
+    requests = [
+        UpdateOne(
+            {"batch_name": batch_name, "patient_id": patient["patient_id"]},
+            {"$set": {"files": patient.get("files", {}), "updated_at": now}, "$setOnInsert": {"created_at": now}},
+            upsert=True
+        )
+        for patient in patients
+    ]
+    result = _database(database)[PATIENTS_COLLECTION].bulk_write(requests, ordered=False)
+    return result.upserted_count + result.modified_count
+
+def load_batch_patients(batch_name, after=None, limit=None, with_excel=False):
+    """
+    Returns (patients, next_cursor) of a batch in patient_id order, or None if
+    the batch does not exist. Pages start after the patient_id `after`; only
+    the requested page is read for migrated batches. Raises ValueError when
+    `after` is not a patient of the batch.
+    """
+    batch_doc = db["batches"].find_one({"batch_name": batch_name}, {"_id": 0, "patients_in_collection": 1})
+    if batch_doc is None:
+        return None
+
+    if not uses_collection(batch_doc):
+        return _page_embedded(batch_name, after, limit, with_excel)
+
+    query = {"batch_name": batch_name}
+    if with_excel:
+        query["files.excel"] = {"$exists": True}
+    if after:
+        query["patient_id"] = {"$gte": after}  # ✅ The cursor patient itself proves the cursor is valid
+
+    cursor = db[PATIENTS_COLLECTION].find(query, {"_id": 0, "patient_id": 1, "files": 1}).sort(PATIENT_ORDER)
+    if limit:
+        cursor = cursor.limit(limit + (2 if after else 1))
+    patients = list(cursor)
+    if after:
+        if not patients or patients[0]["patient_id"] != after:
+            raise ValueError(f"Unknown cursor '{after}'")
+        patients = patients[1:]
+
+    next_cursor = None
+    if limit and len(patients) > limit:
+        patients = patients[:limit]
+        next_cursor = patients[-1]["patient_id"]
+    return patients, next_cursor
+
+def _page_embedded(batch_name, after=None, limit=None, with_excel=False):
+    """
+    Same paging over the embedded array of a batch that was not migrated yet.
+    """
+    batch_doc = db["batches"].find_one({"batch_name": batch_name}, {"_id": 0, "patients": 1}) or {}
+    patients = [
+        patient for patient in batch_doc.get("patients", [])
+        if not with_excel or "excel" in patient.get("files", {})
+    ]
+    patients.sort(key=lambda patient: patient["patient_id"])
+    if after:
+        if not any(patient["patient_id"] == after for patient in patients):
+            raise ValueError(f"Unknown cursor '{after}'")
+        patients = [patient for patient in patients if patient["patient_id"] > after]
+
+    next_cursor = None
+    if limit and len(patients) > limit:
+        patients = patients[:limit]
+        next_cursor = patients[-1]["patient_id"]
+    return patients, next_cursor
+
+def patient_directory():
+    """
+    Returns {batch_name: [patient ids]} for every batch, reading embedded
+    arrays only for batches that were not migrated.
+    """
+    batches = {}
+    migrated = set()
+    for batch_doc in db["batches"].find({}, {"_id": 0, "batch_name": 1, "patients_in_collection": 1, "patients.patient_id": 1}):
+        batch_name = batch_doc["batch_name"]
+        if uses_collection(batch_doc):
+            batches[batch_name] = []
+            migrated.add(batch_name)
+        else:
+            batches[batch_name] = sorted(patient["patient_id"] for patient in batch_doc.get("patients", []))
+
+    if migrated:
+        # ✅ Only patients of migrated batches, in (batch_name, patient_id) index order
+        cursor = db[PATIENTS_COLLECTION].find(
+            {"batch_name": {"$in": sorted(migrated)}}, {"_id": 0, "batch_name": 1, "patient_id": 1}
+        ).sort([("batch_name", ASCENDING), ("patient_id", ASCENDING)])
+        for patient in cursor:
+            batches[patient["batch_name"]].append(patient["patient_id"])
+    return batches
+
+def migrate_batch(batch_name, keep_embedded=False):
+    """
+    Moves the embedded patients array of one batch into the patients
+    collection and flags the batch. Safe to rerun. Returns the patients moved.
+    """
+    batch_doc = db["batches"].find_one({"batch_name": batch_name}, {"_id": 0, "patients": 1, "patients_in_collection": 1})
+    if batch_doc is None or uses_collection(batch_doc):
+        return 0
+
+    patients = batch_doc.get("patients", [])
+    save_patients(batch_name, patients)
+    update = {"$set": {"patients_in_collection": True}}
+    if not keep_embedded:
+        update["$unset"] = {"patients": ""}
+    db["batches"].update_one({"batch_name": batch_name}, update)
+    return len(patients)
+
+def migrate_batches(batch_name=None, keep_embedded=False):
+    """
+    Migrates every batch (or one) that still embeds its patients.
+    """
+    from services.file_service import invalidate_batches
+
+    query = {"patients_in_collection": {"$ne": True}}
+    if batch_name:
+        query["batch_name"] = batch_name
+
+    moved = {}
+    for batch_doc in db["batches"].find(query, {"_id": 0, "batch_name": 1}):
+        moved[batch_doc["batch_name"]] = migrate_batch(batch_doc["batch_name"], keep_embedded)
+        print(f"✅ {batch_doc['batch_name']}: {moved[batch_doc['batch_name']]} patients moved")
+
+    if moved:
+        invalidate_batches()
+    return moved
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move embedded batches.patients arrays into the patients collection")
+    parser.add_argument("--batch", help="Only this batch")
+    parser.add_argument("--keep-embedded", action="store_true", help="Leave the old arrays in place (for rollback)")
+    args = parser.parse_args()
+
+    from config.schema import ensure_indexes
+    ensure_indexes(db, [PATIENTS_COLLECTION])
+    print(migrate_batches(args.batch, args.keep_embedded))
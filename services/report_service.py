@@ -0,0 +1,257 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pymongo.write_concern import WriteConcern
+from mongo_connection import db  # ✅ Import MongoDB connection
+from config.config import REPORT_WRITE_CONCERN, REPORT_WRITE_JOURNAL, STATUS_TOKEN_OVERLAP_MS
+
+# ✅ Report timestamps and availability updated_at are set by the server
+# ($currentDate), so status tokens compare one clock, not each web host's.
+# Polls re-read STATUS_TOKEN_OVERLAP_MS behind the token, which covers writes
+# that became visible after a later-stamped write was already read.
+
+EPOCH = datetime(1970, 1, 1)
+STATUS_BACKFILL = ({"updated_at": {"$exists": False}}, {"$currentDate": {"updated_at": True}})
+
+def encode_status_token(changed_at):
+    """
+    Encodes a change timestamp as an opaque token (milliseconds since epoch).
+    """
+    return str((changed_at - EPOCH) // timedelta(milliseconds=1)) if changed_at else None
+
+def decode_status_token(token):
+    """
+    Decodes a token produced by encode_status_token. Raises ValueError,
+    also for negative tokens and ones beyond the datetime range.
+    """
+    millis = int(token)
+    if millis < 0:
+        raise ValueError(f"Negative status token {token}")
+    try:
+        return EPOCH + timedelta(milliseconds=millis)
+    except OverflowError:
+        raise ValueError(f"Status token {token} is out of range")
+
+def _status_pipeline(batch_name, since=None, patient_ids=None):
+    """
+    Merges submitted_reports and availability_status into one document per
+    patient, reading only the fields the status needs (never report_data).
+    """
+    report_match = {"batch": batch_name}
+    availability_match = {"batch": batch_name}
+    if since is not None:
+        report_match["timestamp"] = {"$gt": since}
+        availability_match["updated_at"] = {"$gt": since}
+    if patient_ids is not None:
+        report_match["patient_id"] = {"$in": patient_ids}
+        availability_match["patient_id"] = {"$in": patient_ids}
+
+    return [
+        {"$match": report_match},
+        {"$project": {"_id": 0, "patient_id": 1, "submitted": {"$literal": True}, "changed": "$timestamp"}},
+        {"$unionWith": {"coll": "availability_status", "pipeline": [
+            {"$match": availability_match},
+            {"$project": {"_id": 0, "patient_id": 1, "available": 1, "changed": "$updated_at"}}
+        ]}},
+        {"$group": {
+            "_id": "$patient_id",
+            "submitted": {"$max": "$submitted"},
+            "available": {"$max": "$available"},
+            "changed": {"$max": "$changed"}
+        }}
+    ]
+
+def _overlap(since):
+    return since - timedelta(milliseconds=STATUS_TOKEN_OVERLAP_MS)
+
+def fetch_report_status(batch_name, since_token=None):
+    """
+    Returns ({patient_id: {"submitted": True, "available": bool}}, token).
+    With since_token, only patients whose report or availability changed
+    after the token (or within the overlap window before it) are returned,
+    each with its full current status.
+    """
+    since = decode_status_token(since_token) if since_token else None
+    patient_ids = None
+
+    if since is not None:
+        # ✅ Cheap first pass: which patients changed since the last poll
+        changed = list(db["submitted_reports"].aggregate(_status_pipeline(batch_name, since=_overlap(since))))
+        if not changed:
+            return {}, since_token
+        patient_ids = [row["_id"] for row in changed]
+
+    rows = db["submitted_reports"].aggregate(_status_pipeline(batch_name, patient_ids=patient_ids))
+    return _collect_status(rows, since)
+
+async def fetch_report_status_async(async_db, batch_name, since_token=None):
+    """
+    Motor version of fetch_report_status for the async serving mode.
+    """
+    since = decode_status_token(since_token) if since_token else None
+    patient_ids = None
+
+    if since is not None:
+        changed = await async_db["submitted_reports"].aggregate(_status_pipeline(batch_name, since=_overlap(since))).to_list(None)
+        if not changed:
+            return {}, since_token
+        patient_ids = [row["_id"] for row in changed]
+
+    rows = await async_db["submitted_reports"].aggregate(_status_pipeline(batch_name, patient_ids=patient_ids)).to_list(None)
+    return _collect_status(rows, since)
+
+def _collect_status(rows, latest=None):
+    patient_reports = {}
+    for row in rows:
+        status = {}
+        if row.get("submitted"):
+            status["submitted"] = True
+        if row.get("available") is not None:
+            status["available"] = row["available"]
+        patient_reports[row["_id"]] = status
+
+        if row.get("changed") and (latest is None or row["changed"] > latest):
+            latest = row["changed"]
+
+    return patient_reports, encode_status_token(latest)
+
+def build_report_entry(batch_name, patient_id, report_data):
+    """
+    Returns the submitted_reports document for one report. Its timestamp
+    is set by the server when it is written (see report_write).
+    """
+    return {
+        "_id": ObjectId(),
+        "batch": batch_name,
+        "patient_id": patient_id,
+        "report_data": report_data
+    }
+
+def report_write(entry):
+    """
+    Inserts one report with the server's clock as its timestamp: an upsert
+    on a fresh _id with $currentDate.
+    """
+    document = {key: value for key, value in entry.items() if key != "_id"}
+    return UpdateOne({"_id": entry["_id"]}, {"$setOnInsert": document, "$currentDate": {"timestamp": True}}, upsert=True)
+
+def availability_update(available):
+    """
+    Update document for availability_status, stamped with the server's clock.
+    """
+    return {"$set": {"available": available}, "$currentDate": {"updated_at": True}}
+
+def backfill_status_timestamps(database):
+    """
+    Gives availability statuses written before updated_at existed a
+    timestamp, so delta polls pick them up. Usable as an on_connect hook.
+    """
+    result = database["availability_status"].update_many(*STATUS_BACKFILL)
+    if result.modified_count:
+        print(f"✅ Backfilled updated_at on {result.modified_count} availability statuses")
+    return result.modified_count
+
+async def backfill_status_timestamps_async(async_db):
+    result = await async_db["availability_status"].update_many(*STATUS_BACKFILL)
+    return result.modified_count
+
+def validate_report(item, default_batch=""):
+    """
+    Returns (entry, None) for a valid report payload or (None, error).
+    """
+    if not isinstance(item, dict):
+        return None, "Report must be an object"
+
+    patient_id = str(item.get("selectedPatient") or "").strip()
+    batch_name = str(item.get("selectedBatch") or default_batch or "").strip()
+    report_data = item.get("report_data", [])
+
+    if not patient_id or not batch_name or not report_data:
+        return None, "Invalid data received"
+    return build_report_entry(batch_name, patient_id, report_data), None
+
+def report_write_concern(w=None):
+    """
+    Builds the write concern for report writes: REPORT_WRITE_CONCERN unless
+    the request overrides it with "majority" or a node count. Raises ValueError.
+    """
+    w = REPORT_WRITE_CONCERN if w in (None, "") else w
+    if isinstance(w, str) and w.isdigit():
+        w = int(w)
+    if w != "majority" and not (isinstance(w, int) and not isinstance(w, bool) and w >= 0):
+        raise ValueError(f"Invalid write concern: {w}")
+    return WriteConcern(w=w, j=REPORT_WRITE_JOURNAL if w != 0 else None)
+
+def reports_collection(write_concern=None, database=None):
+    return (database if database is not None else db)["submitted_reports"].with_options(
+        write_concern=write_concern or report_write_concern()
+    )
+
+def insert_report(entry, write_concern=None):
+    """
+    Stores one report and returns its id.
+    """
+    reports_collection(write_concern).bulk_write([report_write(entry)])
+    return entry["_id"]
+
+async def insert_report_async(async_db, entry, write_concern=None):
+    await reports_collection(write_concern, async_db).bulk_write([report_write(entry)])
+    return entry["_id"]
+
+def prepare_reports(items, default_batch=""):
+    """
+    Validates a list of report payloads. Returns (entries, results) where
+    results holds one outcome per item, pre-filled for the invalid ones.
+    """
+    entries, results = [], []
+    for index, item in enumerate(items):
+        entry, error = validate_report(item, default_batch)
+        if error:
+            results.append({"index": index, "status": "invalid", "error": error})
+            continue
+        entries.append((index, entry))
+        results.append({"index": index, "patient_id": entry["patient_id"], "batch": entry["batch"]})
+    return entries, results
+
+def _collect_bulk_results(entries, results, write_errors, acknowledged):
+    failed = {error["index"]: error.get("errmsg", "Write failed") for error in write_errors}
+    for position, (index, entry) in enumerate(entries):
+        if position in failed:
+            results[index].update({"status": "failed", "error": failed[position]})
+        else:
+            results[index].update({"status": "submitted" if acknowledged else "sent", "report_id": str(entry["_id"])})
+    return results
+
+def submit_reports(items, default_batch="", write_concern=None):
+    """
+    Validates and stores many reports with one unordered bulk write, so a
+    bad document does not stop the rest. Returns one outcome per item.
+    """
+    entries, results = prepare_reports(items, default_batch)
+    if not entries:
+        return results
+
+    write_concern = write_concern or report_write_concern()
+    write_errors = []
+    try:
+        reports_collection(write_concern).bulk_write([report_write(entry) for _, entry in entries], ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+    return _collect_bulk_results(entries, results, write_errors, write_concern.acknowledged)
+
+async def submit_reports_async(async_db, items, default_batch="", write_concern=None):
+    """
+    Motor version of submit_reports for the async serving mode.
+    """
+    entries, results = prepare_reports(items, default_batch)
+    if not entries:
+        return results
+
+    write_concern = write_concern or report_write_concern()
+    write_errors = []
+    try:
+        await reports_collection(write_concern, async_db).bulk_write([report_write(entry) for _, entry in entries], ordered=False)
+    except BulkWriteError as e:
+        write_errors = e.details.get("writeErrors", [])
+    return _collect_bulk_results(entries, results, write_errors, write_concern.acknowledged)
@@ -0,0 +1,189 @@
+import argparse
+import hashlib
+import logging
+import os
+import threading
+from bson import ObjectId
+from mongo_connection import db, fs  # ✅ Import MongoDB connection
+from config.config import SIDECAR_DIR, SIDECAR_ENABLED
+from services.arrow_sidecar import SIDECAR_FORMAT, SIDECAR_VERSION, arrow_available, encode_sheets
+from services.metrics import log_event, record_gridfs_read, stage
+from services.workbook_parser import read_sheets
+
+# ✅ Each Excel file in GridFS can have an Arrow IPC sidecar (file_type "sidecar",
+# sidecar_of = source id). The source's fs.files document carries a "sidecar"
+# summary, so readers find it without an extra query. Sidecars record their
+# digest as blob_sha256, which keeps them out of the unique (sha256, batch,
+# patient_id) index of uploaded files: identical sheet data gives identical blobs.
+
+logger = logging.getLogger(__name__)
+
+def sidecars_enabled():
+    return SIDECAR_ENABLED and arrow_available()
+
+def source_fingerprint(file_obj):
+    """
+    Identifies the content of a source workbook: its md5, else its sha256,
+    else its length and upload date. Accepts an fs.files document or a GridOut.
+    """
+    if isinstance(file_obj, dict):
+        md5, sha256 = file_obj.get("md5"), file_obj.get("sha256")
+        length, upload_date = file_obj.get("length"), file_obj.get("uploadDate")
+    else:
+        md5, sha256 = getattr(file_obj, "md5", None), getattr(file_obj, "sha256", None)
+        length, upload_date = file_obj.length, file_obj.upload_date
+    if md5:
+        return f"md5:{md5}"
+    if sha256:
+        return f"sha256:{sha256}"
+    return f"{length}:{upload_date.isoformat() if upload_date else ''}"
+
+def current_sidecar(file_obj):
+    """
+    Returns the sidecar summary of a workbook if it was built from this
+    exact content with the current format version, else None (missing or stale).
+    """
+    info = file_obj.get("sidecar") if isinstance(file_obj, dict) else getattr(file_obj, "sidecar", None)
+    if not info or info.get("format") != SIDECAR_FORMAT or info.get("version") != SIDECAR_VERSION:
+        return None
+    if info.get("source") != source_fingerprint(file_obj):
+        return None
+    return info
+
+def build_sidecar(file_doc, content=None, sheets=None):
+    """
+    Writes the Arrow sidecar of a workbook to GridFS, records it on the source
+    document and removes sidecars of older versions. Pass the workbook bytes,
+    or sheets already read from them. Returns the sidecar summary, or None if
+    pyarrow is missing or the workbook cannot be stored faithfully.
+    """
+    if not sidecars_enabled():
+        return None
+
+    try:
+        blob, index = encode_sheets(sheets if sheets is not None else read_sheets(content))
+    except ValueError as e:
+        log_event(logger, logging.WARNING, "sidecar_skipped", file=file_doc.get("filename"), reason=str(e))
+        return None
+
+    source_id = file_doc["_id"]
+    digest = hashlib.sha256(blob).hexdigest()
+    sidecar_id = fs.put(
+        blob, filename=f"{file_doc.get('filename')}.arrow", file_type="sidecar", sidecar_of=source_id,
+        format=SIDECAR_FORMAT, version=SIDECAR_VERSION, blob_sha256=digest,
+        source_md5=file_doc.get("md5"), source_sha256=file_doc.get("sha256"), batch=file_doc.get("batch"),
+        patient_id=file_doc.get("patient_id")
+    )
+
+    info = {
+        "file_id": sidecar_id,
+        "format": SIDECAR_FORMAT,
+        "version": SIDECAR_VERSION,
+        "source": source_fingerprint(file_doc),
+        "sha256": digest,
+        "length": len(blob),
+        "sheets": index
+    }
+    db["fs.files"].update_one({"_id": source_id}, {"$set": {"sidecar": info}})
+
+    for old in db["fs.files"].find({"sidecar_of": source_id, "_id": {"$ne": sidecar_id}}, {"_id": 1}):
+        fs.delete(old["_id"])
+
+    log_event(logger, logging.INFO, "sidecar_built", file=file_doc.get("filename"), bytes=len(blob), sheets=len(index))
+    return info
+
+_materialize_lock = threading.Lock()
+
+def materialize_sidecar(info):
+    """
+    Returns the local path of a sidecar, downloading it from GridFS on first
+    use. Downloads are checked against the recorded sha256 before they
+    become visible; returns None if the sidecar is unavailable or corrupt.
+    """
+    path = os.path.join(SIDECAR_DIR, f"{info['file_id']}.arrow")
+    if os.path.exists(path) and os.path.getsize(path) == info["length"]:
+        return path
+
+    with _materialize_lock:
+        if os.path.exists(path) and os.path.getsize(path) == info["length"]:
+            return path
+
+        try:
+            os.makedirs(SIDECAR_DIR, exist_ok=True)
+            grid_out = fs.get(ObjectId(info["file_id"]))
+            digest = hashlib.sha256()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                for chunk in grid_out:
+                    digest.update(chunk)
+                    f.write(chunk)
+            record_gridfs_read(info["length"], purpose="sidecar")
+
+            if digest.hexdigest() != info["sha256"]:
+                os.remove(tmp_path)
+                log_event(logger, logging.WARNING, "sidecar_corrupt", sidecar_id=info["file_id"])
+                return None
+            os.replace(tmp_path, path)  # ✅ Atomic, readers never see partial files
+            return path
+
+        except Exception as e:
+            log_event(logger, logging.WARNING, "sidecar_unavailable", sidecar_id=info["file_id"], error=str(e))
+            return None
+
+def discard_materialized(file_obj):
+    """
+    Removes the local copy of a workbook's sidecar after it failed to load,
+    so the next read downloads and verifies it again.
+    """
+    info = current_sidecar(file_obj)
+    if info:
+        try:
+            os.remove(os.path.join(SIDECAR_DIR, f"{info['file_id']}.arrow"))
+        except OSError:
+            pass
+
+def sidecar_for(file_obj):
+    """
+    Returns (local_path, sheet_index) of a workbook's current sidecar, or
+    None when the xlsx has to be parsed instead.
+    """
+    if not sidecars_enabled():
+        return None
+
+    info = current_sidecar(file_obj)
+    if info is None:
+        return None
+
+    with stage("sidecar_fetch"):
+        path = materialize_sidecar(info)
+    return (path, info["sheets"]) if path else None
+
+def backfill_sidecars(batch_name=None, force=False):
+    """
+    Builds missing or stale sidecars for the Excel files already in GridFS.
+    """
+    if not sidecars_enabled():
+        raise SystemExit("❌ pyarrow is not installed (or SIDECAR_ENABLED is off)")
+
+    query = {"file_type": "excel"}
+    if batch_name:
+        query["batch"] = batch_name
+
+    counts = {"built": 0, "current": 0, "skipped": 0}
+    for file_doc in db["fs.files"].find(query):
+        if not force and current_sidecar(file_doc):
+            counts["current"] += 1
+            continue
+
+        info = build_sidecar(file_doc, content=fs.get(file_doc["_id"]).read())
+        counts["built" if info else "skipped"] += 1
+        print(f"{'✅' if info else '⚠️'} {file_doc.get('filename')}: {'sidecar built' if info else 'skipped'}")
+
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build Arrow sidecars for Excel files in GridFS")
+    parser.add_argument("--batch", help="Only this batch")
+    parser.add_argument("--force", action="store_true", help="Rebuild current sidecars too")
+    args = parser.parse_args()
+    print(backfill_sidecars(args.batch, args.force))
@@ -0,0 +1,50 @@
+import gridfs
+from flask import current_app, request
+from werkzeug.wsgi import wrap_file
+from mongo_connection import get_db  # ✅ Import MongoDB connection
+from services.metrics import record_gridfs_read
+
+def open_gridfs_file(file_doc):
+    """
+    Opens a GridFS file from an already fetched fs.files document, without
+    looking the file up a second time.
+    """
+    return gridfs.GridOut(get_db()["fs"], file_document=file_doc)
+
+def gridfs_etag(file_obj):
+    """
+    Builds a strong ETag from the GridFS md5, falling back to the file id,
+    length and upload date for files stored without an md5.
+    """
+    md5 = getattr(file_obj, "md5", None)
+    if md5:
+        return md5
+    return f"{file_obj._id}-{file_obj.length}-{int(file_obj.upload_date.timestamp() * 1000)}"
+
+def send_gridfs_file(file_obj, mimetype, as_attachment=False, download_name=None, content_encoding=None):
+    """
+    Streams a GridFS file chunk by chunk instead of reading it into memory.
+    Supports Range requests (206) and conditional GETs (304) based on the
+    ETag and Last-Modified headers. Pass content_encoding for files stored
+    compressed; they are sent as-is with a Content-Encoding header.
+    """
+    body = wrap_file(request.environ, file_obj, buffer_size=file_obj.chunk_size)
+    response = current_app.response_class(body, mimetype=mimetype, direct_passthrough=True)
+    response.content_length = file_obj.length
+    response.last_modified = file_obj.upload_date
+    etag = gridfs_etag(file_obj)
+    if content_encoding:
+        response.headers["Content-Encoding"] = content_encoding
+        etag = f"{etag}-{content_encoding}"  # ✅ Distinct from the identity representation
+    response.set_etag(etag)
+    response.cache_control.no_cache = True  # ✅ Always revalidate, repeated views get a 304
+    response.headers["Accept-Ranges"] = "bytes"  # ✅ Lets PDF.js switch to range requests
+
+    if download_name:
+        disposition = "attachment" if as_attachment else "inline"
+        response.headers.set("Content-Disposition", disposition, filename=download_name)
+
+    response = response.make_conditional(request.environ, accept_ranges=True, complete_length=file_obj.length)
+    if response.status_code in (200, 206):
+        record_gridfs_read(response.content_length or 0, purpose="serve")
+    return response
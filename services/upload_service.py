@@ -0,0 +1,106 @@
+import hashlib
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from gridfs.errors import FileExists
+from werkzeug.sansio.multipart import Data, Epilogue, File, MultipartDecoder, NeedData
+from mongo_connection import db, fs  # ✅ Import MongoDB connection
+from config.config import UPLOAD_WORKERS, UPLOAD_QUEUE_CHUNKS
+
+READ_SIZE = 64 * 1024
+
+_DONE = object()
+_ABORT = object()
+
+def stream_files_to_gridfs(stream, boundary, batch_name, patient_id, field_name="pdfs", file_type="pdf"):
+    """
+    Decodes a multipart body straight from the request stream and writes each
+    `field_name` part into GridFS chunks as it arrives, without spooling the
+    upload first. Parts are written concurrently on a thread pool; memory is
+    bounded by UPLOAD_QUEUE_CHUNKS per file. Returns per-file results in
+    upload order.
+    """
+    decoder = MultipartDecoder(boundary.encode("latin-1"))
+    futures = []
+    current = None
+
+    with ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+        try:
+            while True:
+                data = stream.read(READ_SIZE)
+                decoder.receive_data(data or None)
+                event = decoder.next_event()
+
+                while not isinstance(event, (NeedData, Epilogue)):
+                    if isinstance(event, File) and event.name == field_name and event.filename:
+                        current = queue.Queue(maxsize=UPLOAD_QUEUE_CHUNKS)
+                        futures.append(executor.submit(
+                            _write_part, current, event.filename, batch_name, patient_id, file_type
+                        ))
+                    elif isinstance(event, Data):
+                        if current is not None:
+                            current.put(event.data)  # ✅ Blocks while the writer is behind
+                            if not event.more_data:
+                                current.put(_DONE)
+                                current = None
+                    else:
+                        current = None  # Other form fields are ignored
+                    event = decoder.next_event()
+
+                if isinstance(event, Epilogue) or not data:
+                    break
+        finally:
+            if current is not None:
+                current.put(_ABORT)  # Truncated body or decode error
+
+    return [future.result() for future in futures]
+
+def _write_part(chunks, filename, batch_name, patient_id, file_type):
+    """
+    Writes one part into GridFS while hashing it. A byte-identical file that
+    already exists for the same patient and batch is discarded instead: the
+    unique (sha256, batch, patient_id) index rejects it, also when another
+    request or process stores it at the same time.
+    """
+    result = {"filename": filename}
+    sha256 = hashlib.sha256()
+    size = 0
+    grid_in = fs.new_file(filename=filename, patient_id=patient_id, batch=batch_name, file_type=file_type)
+
+    while True:
+        chunk = chunks.get()
+        if chunk is _DONE or chunk is _ABORT:
+            break
+        if "error" in result:
+            continue  # Keep draining so the reader never blocks
+        try:
+            grid_in.write(chunk)
+            sha256.update(chunk)
+            size += len(chunk)
+        except Exception as e:
+            result["error"] = str(e)
+
+    if chunk is _ABORT and "error" not in result:
+        result["error"] = "Upload interrupted"
+    if "error" in result:
+        grid_in.abort()
+        return result
+
+    try:
+        digest = sha256.hexdigest()
+        grid_in.sha256 = digest
+        try:
+            grid_in.close()
+        except FileExists:  # GridFS reports the unique index violation as FileExists
+            grid_in.abort()  # ✅ Removes the chunks written for the rejected copy
+            existing = db["fs.files"].find_one(
+                {"sha256": digest, "patient_id": patient_id, "batch": batch_name}, {"_id": 1}
+            )
+            if existing is None:
+                raise
+            return {**result, "file_id": str(existing["_id"]), "status": "duplicate", "size": size}
+
+        return {**result, "file_id": str(grid_in._id), "status": "stored", "size": size}
+
+    except Exception as e:
+        grid_in.abort()
+        return {**result, "error": str(e)}
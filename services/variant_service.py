@@ -0,0 +1,129 @@
+import re
+from bson import ObjectId
+from pymongo import ASCENDING
+from mongo_connection import db  # ✅ Import MongoDB connection
+from config.schema import ensure_indexes
+from services.workbook_parser import parse_workbook
+
+variants_collection = db["variants"]
+
+# Query parameter -> (document field, normalizer)
+VARIANT_FILTERS = {
+    "batch_name": ("batch", None),
+    "patient_id": ("patient_id", None),
+    "gene": ("gene", lambda value: value.upper()),
+    "rsid": ("rsid", lambda value: value.lower()),
+    "sheet": ("sheet", None),
+    "clnsig": ("clnsig_terms", lambda value: value.lower()),
+}
+
+def ensure_variant_indexes():
+    """
+    Creates the variant collection indexes (no-op when they already exist).
+    """
+    ensure_indexes(db, ["variants"])
+
+def clnsig_terms(value):
+    """
+    Splits a ClinVar CLNSIG value such as "Pathogenic/Likely_pathogenic"
+    into lowercase terms: ["pathogenic", "likely pathogenic"].
+    """
+    if not isinstance(value, str):
+        return []
+    return [term.strip().replace("_", " ").lower() for term in re.split(r"[/|,;]", value) if term.strip()]
+
+def build_variant_documents(batch_name, patient_id, file_id, file_name, conditions):
+    """
+    Normalizes parsed condition rows into variant documents. The original
+    row is kept as-is under "row" so batch-data can be served from the index.
+    """
+    documents = []
+    for seq, row in enumerate(conditions):
+        gene = row.get("Gene Name")
+        rsid = row.get("rsID")
+        documents.append({
+            "batch": batch_name,
+            "patient_id": patient_id,
+            "file_id": str(file_id),
+            "file_name": file_name,
+            "seq": seq,
+            "sheet": row.get("subtype_cond"),
+            "gene": gene.upper() if isinstance(gene, str) else gene,
+            "rsid": rsid.lower() if isinstance(rsid, str) else rsid,
+            "clnsig": row.get("clin sig"),
+            "clnsig_terms": clnsig_terms(row.get("clin sig")),
+            "row": row,
+        })
+    return documents
+
+def index_workbook(batch_name, patient_id, file_id, file_name, content, conditions=None):
+    """
+    Parses a workbook and (re)writes its rows into the variants collection.
+    Marks the GridFS file with the number of indexed rows. Pass conditions
+    when the caller has already parsed the workbook.
+    """
+    if conditions is None:
+        conditions = parse_workbook(content).get("conditions", [])
+    documents = build_variant_documents(batch_name, patient_id, file_id, file_name, conditions)
+
+    variants_collection.delete_many({"file_id": str(file_id)})
+    if documents:
+        variants_collection.insert_many(documents, ordered=False)
+
+    db["fs.files"].update_one({"_id": ObjectId(file_id)}, {"$set": {"variants_indexed": len(documents)}})
+    return len(documents)
+
+def load_indexed_conditions(file_id, projection=None):
+    """
+    Returns the condition rows of an indexed workbook in sheet/row order,
+    optionally only the sheets and fields of a projection.
+    """
+    query = {"file_id": str(file_id)}
+    fields = {"_id": 0, "row": 1}
+    if projection is not None:
+        sheets, keys = projection
+        if sheets:
+            query["sheet"] = {"$in": [re.compile(f"^{re.escape(name)}$", re.IGNORECASE) for name in sheets]}
+        if keys:
+            fields = {"_id": 0, **{f"row.{key}": 1 for key in keys}}
+
+    cursor = variants_collection.find(query, fields).sort("seq", ASCENDING)
+    if projection is not None and projection[1]:
+        return [{key: document.get("row", {}).get(key) for key in projection[1]} for document in cursor]
+    return [document["row"] for document in cursor]
+
+def build_variant_query(args):
+    """
+    Builds a Mongo filter from request arguments (see VARIANT_FILTERS).
+    """
+    query = {}
+    for param, (field, normalize) in VARIANT_FILTERS.items():
+        value = args.get(param, "").strip()
+        if value:
+            query[field] = normalize(value) if normalize else value
+    return query
+
+def query_variants(query, limit=100, after=None):
+    """
+    Returns (variants, next_cursor) for an indexed variant query, paginated
+    by _id.
+    """
+    if after:
+        if not ObjectId.is_valid(after):
+            raise ValueError(f"Invalid cursor: {after}")
+        query = {**query, "_id": {"$gt": ObjectId(after)}}
+
+    documents = list(variants_collection.find(query).sort("_id", ASCENDING).limit(limit + 1))
+    next_cursor = str(documents[limit - 1]["_id"]) if len(documents) > limit else None
+
+    variants = []
+    for document in documents[:limit]:
+        document["_id"] = str(document["_id"])
+        variants.append(document)
+    return variants, next_cursor
+
+def query_variant_patients(query):
+    """
+    Returns the sorted patient ids that carry at least one matching variant.
+    """
+    return sorted(variants_collection.distinct("patient_id", query))
@@ -0,0 +1,252 @@
+import io
+import time
+
+# ✅ Kept free of MongoDB imports so process-pool workers stay lightweight.
+# pandas (and openpyxl through it) is imported on first parse, not at startup.
+
+CATEGORY_ICON_MAPPING = {
+    "Pathogenic Variants": "Icons/PathogenicVariantsIcon.png",
+    "Conflicting Variants": "Icons/ConflictingVariantsIcon.png",
+    "Diabetes": "Icons/DiabetesIcon.png",
+    "High Blood Pressure": "Icons/High_Blood_PressureIcon.png",
+    "Cardiac Health": "Icons/Cardiac_HealthIcon.png",
+    "Cholesterol Disorders": "Icons/Cholesterol_DisordersIcon.png",
+    "Thyroid Disorders": "Icons/Thyroid_DisordersIcon.png",
+    "Parkinsons": "Icons/ParkinsonsIcon.png",
+    "Dementia": "Icons/DementiaIcon.png",
+    "Headaches": "Icons/HeadachesIcon.png",
+    "Allergies": "Icons/AllergiesIcon.png",
+    "Anemia": "Icons/AnemiaIcon.png",
+    "Fatty Liver": "Icons/Fatty_LiverIcon.png",
+    "Gall stones": "Icons/Gall_stonesIcon.png",
+    "Pancreatic Disorders": "Icons/Pancreatic_DisordersIcon.png",
+    "Gut Health": "Icons/Gut_HealthIcon.png",
+    "Gastritis": "Icons/GastritisIcon.png",
+    "Glomerular Diseases": "Icons/Glomerular_DiseasesIcon.png",
+    "Interstitial Nephritis": "Icons/Interstitial_NephritisIcon.png",
+    "Renal stones": "Icons/Renal_stonesIcon.png",
+    "Skin Health": "Icons/Skin_HealthIcon.png",
+    "Arthritis Degenerative Joint": "Icons/Arthritis_Degenerative_JointIcon.png",
+    "Mood Disorders": "Icons/Mood_DisordersIcon.png",
+    "Obesity": "Icons/ObesityIcon.png",
+    "Bone Joint health": "Icons/Bone_Joint_healthIcon.png",
+    "Muscular health": "Icons/Muscular_healthIcon.png"
+}
+
+# Output key -> source column (after "_" has been replaced by " ")
+CONDITION_FIELDS = [
+    ("Condition", "Condition"),
+    ("Headings", "Headings"),
+    ("subtype_cond", None),
+    ("Gene Name", "Gene"),
+    ("Gene Score", "Gene Score"),
+    ("rsID", "rsID"),
+    ("Lit", "Literature"),
+    ("ref", "REF"),
+    ("alt", "ALT"),
+    ("CH", "CHROM"),
+    ("POS", "POS"),
+    ("Zygosity", "Zygosity"),
+    ("Consequence", "Consequence"),
+    ("Conseq score", "Consequence score"),
+    ("IMPACT", "IMPACT"),
+    ("IMPACT score", "IMPACT score"),
+    ("ClinVar CLNDN", "ClinVar CLNDN"),
+    ("Clinical consequence", "Clinical consequence"),
+    ("clin sig", "ClinVar CLNSIG"),
+    ("Variant type", "Variant type")
+]
+
+VARIANT_SHEETS = ["Pathogenic Variants", "Conflicting Variants"]
+
+CONDITION_KEYS = [key for key, _ in CONDITION_FIELDS]
+
+def make_projection(sheets=None, fields=None):
+    """
+    Normalizes requested sheet names and condition keys into a hashable
+    (sheets, fields) projection, or None for the whole workbook. Sheet names
+    match case-insensitively. Raises ValueError for unknown fields.
+    """
+    sheets = tuple(dict.fromkeys(name.strip() for name in sheets or [] if name.strip())) or None
+    fields = [field.strip() for field in fields or [] if field.strip()]
+    unknown = [field for field in fields if field not in CONDITION_KEYS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    fields = tuple(key for key in CONDITION_KEYS if key in fields) or None
+    return (sheets, fields) if sheets or fields else None
+
+def projection_key(projection):
+    """
+    Cache-key suffix of a projection ("" for the whole workbook).
+    """
+    if projection is None:
+        return ""
+    sheets, fields = projection
+    return f"sheets={'|'.join(sorted(name.lower() for name in sheets or []))};fields={'|'.join(fields or [])}"
+
+def wants_sheet(projection, sheet_name):
+    if projection is None or projection[0] is None:
+        return True
+    return sheet_name.lower() in {name.lower() for name in projection[0]}
+
+def display_name(column):
+    return ' '.join(str(column).split('_'))
+
+def needed_columns(projection):
+    """
+    Display names of the columns a projection reads, or None for all. Headings
+    and Condition are always kept for the subcategory tree.
+    """
+    if projection is None or projection[1] is None:
+        return None
+    fields = set(projection[1])
+    return {"Headings", "Condition"} | {source for key, source in CONDITION_FIELDS if key in fields and source}
+
+def project_patient_data(patient_data, projection):
+    """
+    Applies a projection to already parsed patient data (e.g. a cached full parse).
+    """
+    if projection is None or "error" in patient_data:
+        return patient_data
+
+    fields = projection[1]
+    conditions = [row for row in patient_data.get("conditions", []) if wants_sheet(projection, row.get("subtype_cond") or "")]
+    if fields is not None:
+        conditions = [{key: row.get(key) for key in fields} for row in conditions]
+    return {
+        "subcategories": [entry for entry in patient_data.get("subcategories", []) if wants_sheet(projection, entry["name"])],
+        "conditions": conditions
+    }
+
+def parse_workbook(content, timings=None, projection=None):
+    """
+    Parses raw workbook bytes into subcategories and conditions.
+    If a timings dict is passed, seconds spent reading the sheets
+    ("excel_parse") and building the rows ("row_conversion") are added to it.
+    A projection limits the sheets read, their columns and the emitted keys.
+    """
+    return build_patient_data(read_sheets(content, timings, projection), timings, projection)
+
+def read_sheets(content, timings=None, projection=None):
+    """
+    Reads every non-empty sheet of a workbook into (sheet_name, DataFrame),
+    or only the sheets and columns a projection needs. A sheet keeps its rows
+    even when none of the projected columns exist in it.
+    """
+    import pandas as pd
+
+    started = time.perf_counter()
+    excel_data = pd.ExcelFile(io.BytesIO(content))
+    columns = needed_columns(projection)
+    sheets = []
+    for sheet_name in excel_data.sheet_names:
+        if not wants_sheet(projection, sheet_name):
+            continue
+        if columns is None:
+            df = excel_data.parse(sheet_name)
+        else:
+            df = excel_data.parse(sheet_name, usecols=_column_filter(columns))
+            df = df.loc[:, [display_name(column) in columns for column in df.columns]]  # Keeps the row count
+        sheets.append((sheet_name, df))
+
+    if timings is not None:
+        timings["excel_parse"] = timings.get("excel_parse", 0) + time.perf_counter() - started
+    return [(sheet_name, df) for sheet_name, df in sheets if len(df.index)]
+
+def _column_filter(columns):
+    """
+    usecols callable for one sheet: the projected columns plus the sheet's
+    first column, so the rows survive even when the sheet has none of the
+    projected columns (the variant sheets have no Headings or Condition).
+    """
+    first = []
+
+    def keep(column):
+        if not first:
+            first.append(column)
+            return True
+        return display_name(column) in columns
+    return keep
+
+def build_patient_data(sheets, timings=None, projection=None):
+    """
+    Builds subcategories and conditions from (sheet_name, DataFrame) pairs,
+    whether they were read from the workbook or from its sidecar.
+    """
+    started = time.perf_counter()
+    patient_data = {"subcategories": [], "conditions": []}
+    fields = projection[1] if projection else None
+
+    for sheet_name, df in sheets:
+        if not len(df.index) or not wants_sheet(projection, sheet_name):
+            continue
+
+        # ✅ Extract "subcategories" (for extract_batch_data)
+        icon_path = CATEGORY_ICON_MAPPING.get(sheet_name, "Icons/DefaultIcon.png")
+
+        # ✅ Fix: Special handling for Pathogenic Variants and Conflicting Variants
+        if sheet_name.lower() in ["pathogenic variants", "conflicting variants"]:
+            patient_data["subcategories"].append({
+                "icon": icon_path,
+                "name": sheet_name,
+                "subcategories": [{"name": sheet_name, "subtype": [{"name": sheet_name}]}]
+            })
+        else:
+            if 'Headings' in df.columns and 'Condition' in df.columns:
+                subcategory_obj = {
+                    "icon": icon_path,
+                    "name": sheet_name,
+                    "subcategories": [
+                        {
+                            "name": heading,
+                            "subtype": [{"name": cond} for cond in group['Condition'].dropna().unique()]
+                        }
+                        for heading, group in df.groupby('Headings')
+                    ]
+                }
+                patient_data["subcategories"].append(subcategory_obj)
+
+        # ✅ Extract "conditions" (for extract_batch_data2)
+        df = df.set_axis([display_name(col) for col in df.columns], axis=1)  # Callers' frames stay untouched
+        patient_data["conditions"].extend(frame_to_conditions(df, sheet_name, fields))
+
+    if timings is not None:
+        timings["row_conversion"] = timings.get("row_conversion", 0) + time.perf_counter() - started
+    return patient_data
+
+def parse_workbook_timed(content, projection=None):
+    """
+    Process-pool entry point: returns (patient_data, timings) so the parent
+    can attribute worker time to the request that asked for it.
+    """
+    timings = {}
+    return parse_workbook(content, timings, projection), timings
+
+def frame_to_conditions(df, sheet_name, fields=None):
+    """
+    Converts a sheet into condition rows column-wise instead of per row.
+    Missing columns become None, and the variant sheets use the sheet name
+    as their Condition and Headings. Empty cells (NaN/NaT) become None, so the
+    rows can be stored in MongoDB and pickled as-is. `fields` limits the emitted keys.
+    """
+    df = df.loc[:, ~df.columns.duplicated()]
+    row_count = len(df.index)
+    keys = []
+    columns = []
+
+    for key, source in CONDITION_FIELDS:
+        if fields is not None and key not in fields:
+            continue
+        keys.append(key)
+        if source is None or (sheet_name in VARIANT_SHEETS and key in ("Condition", "Headings")):
+            columns.append([sheet_name] * row_count)
+        elif source in df.columns:
+            column = df[source]
+            values = column.tolist()
+            if column.hasnans:  # ✅ NaN/NaT -> None, only for columns that have gaps
+                values = [None if missing else value for value, missing in zip(values, column.isna().tolist())]
+            columns.append(values)
+        else:
+            columns.append([None] * row_count)
+
+    return [dict(zip(keys, values)) for values in zip(*columns)]
@@ -0,0 +1,89 @@
+import os
+import sys
+
+# ✅ Tests import the app modules the same way the app does, from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("JOB_WORKERS", "0")  # Tests run jobs explicitly
+os.environ.setdefault("EXTRACT_WORKERS", "1")
+os.environ.setdefault("JOB_PREWARM", "0")
+
+import mongomock
+import mongomock.aggregate
+import mongomock.gridfs
+import pytest
+import motor.motor_asyncio  # noqa: F401  Motor has to be imported before mongomock patches gridfs
+
+mongomock.gridfs.enable_gridfs_integration()
+
+def _create_indexes(self, indexes, session=None):
+    # mongomock's create_indexes drops partialFilterExpression; create_index keeps it
+    return [
+        self.create_index(list(index.document["key"].items()), **{k: v for k, v in index.document.items() if k != "key"})
+        for index in indexes
+    ]
+
+mongomock.collection.Collection.create_indexes = _create_indexes
+
+def _union_with(in_collection, database, options):
+    # $unionWith (report status) is not implemented by mongomock
+    other = mongomock.aggregate.process_pipeline(
+        list(database[options["coll"]].find()), database, options.get("pipeline", []), None
+    )
+    return list(in_collection) + list(other)
+
+mongomock.aggregate._PIPELINE_HANDLERS.setdefault("$unionWith", _union_with)
+
+import mongo_connection
+
+@pytest.fixture
+def mongo():
+    """
+    A fresh in-memory MongoDB (mongomock) installed as the app's client.
+    """
+    from services import file_service
+
+    mongo_connection.use_client(mongomock.MongoClient())
+    file_service._directory.update(version=None, batches={})
+    return mongo_connection.get_db()
+
+def _patch_mongomock_motor(mongomock_motor):
+    # Motor's GridOut reads collection.delegate and report writes use
+    # with_options(); mongomock_motor resolves the first to a sub-collection
+    # and returns a synchronous collection from the second
+    collection_class = mongomock_motor.AsyncMongoMockCollection
+    collection_class.delegate = property(lambda self: self._AsyncMongoMockCollection__collection)
+    collection_class.with_options = lambda self, **kwargs: collection_class(
+        self.database, self._AsyncMongoMockCollection__collection.with_options(**kwargs)
+    )
+
+@pytest.fixture
+def async_db(mongo):
+    """
+    A Motor stand-in (mongomock_motor) for async_app.py, over the `mongo` database.
+    """
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    _patch_mongomock_motor(mongomock_motor)
+    client = mongomock_motor.AsyncMongoMockClient(mock_mongo_client=mongo.client)  # Same data as `mongo`
+    mongo_connection.use_async_client(client)
+    return client[mongo_connection.MONGO_DB_NAME]
+
+@pytest.fixture
+def client(mongo):
+    """
+    Test client of the Flask app (app.py) on the mongomock database.
+    """
+    from app import app
+
+    return app.test_client()
+
+@pytest.fixture
+def batch(mongo):
+    """
+    A two-patient synthetic batch stored like config/store.py stores it, with a cold workbook cache.
+    """
+    from benchmarks.workbook_generator import WorkbookPool, load_batch
+    from services.excel_cache import excel_cache
+
+    load_batch(mongo, mongo_connection.get_fs(), "B1", 2, WorkbookPool(rows=8, distinct=2), pdf_size=1000)
+    excel_cache.clear()
+    return "B1"
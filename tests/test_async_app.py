@@ -0,0 +1,74 @@
+import asyncio
+import json
+import pytest
+from services.json_provider import dumps_bytes
+from services.patient_service import extract_batch_data2
+
+@pytest.fixture
+def call(async_db):
+    """
+    Sends one request to async_app.py and returns (response, body).
+    """
+    import async_app
+
+    async def send(method, path, **kwargs):
+        response = await getattr(async_app.app.test_client(), method)(path, **kwargs)
+        return response, await response.get_data()
+
+    return lambda method, path, **kwargs: asyncio.run(send(method, path, **kwargs))
+
+def test_batch_directory(call, batch):
+    response, _ = call("get", "/get-batches")
+    assert response.status_code == 200
+    assert batch in asyncio.run(response.get_json())
+
+    not_modified, _ = call("get", "/get-batches", headers={"If-None-Match": response.headers["ETag"]})
+    assert not_modified.status_code == 304
+    assert call("get", f"/get-batches/{batch}")[0].status_code == 200
+    assert call("get", "/get-batches/NOPE")[0].status_code == 404
+
+def test_batch_data(call, batch):
+    response, body = call("get", f"/get-batch-data2?batch_name={batch}")
+    assert response.status_code == 200
+    assert json.loads(body) == json.loads(dumps_bytes(extract_batch_data2(batch)))
+
+    assert call("get", f"/get-batch-data?batch_name={batch}")[0].status_code == 200
+    assert call("get", "/get-batch-data2")[0].status_code == 400
+    assert call("get", f"/get-batch-data2?batch_name={batch}&fields=nope")[0].status_code == 400
+
+def test_file_downloads(call, mongo, batch):
+    excel = mongo["fs.files"].find_one({"batch": batch, "file_type": "excel"})
+    patient_id = excel["patient_id"]
+
+    response, body = call("get", f"/f/{batch}/{patient_id}")
+    assert response.status_code == 200
+    assert len(body) == excel["length"]
+    assert call("get", f"/f/{batch}/{patient_id}", headers={"Range": "bytes=0-9"})[1] == body[:10]
+
+    pdf, pdf_body = call("get", f"/patient_files/{batch}/{patient_id}/pdf")
+    assert pdf.status_code == 200 and pdf.mimetype == "application/pdf" and len(pdf_body) == 1000
+    assert call("get", f"/patient_files/{batch}/{patient_id}/nope")[0].status_code == 400
+    assert call("get", f"/patient_files/{batch}/NOBODY/pdf")[0].status_code == 404
+    assert call("get", f"/f/{batch}/NOBODY")[0].status_code == 404
+
+def test_reports_and_status(call, batch):
+    submitted, _ = call("post", "/submit-report", json={"selectedBatch": "B2", "selectedPatient": "P1", "report_data": [{"a": 1}]})
+    assert submitted.status_code == 200
+
+    bulk, _ = call("post", "/submit-reports", json={"selectedBatch": "B2", "reports": [
+        {"selectedPatient": "P2", "report_data": [{"a": 1}]}, {"selectedPatient": "", "report_data": []}
+    ]})
+    assert asyncio.run(bulk.get_json())["submitted"] == 1
+
+    updated, _ = call("post", "/update-availability", json={"batch_name": "B2", "patient_id": "P3", "availability": "available"})
+    assert updated.status_code == 200
+
+    status, _ = call("get", "/get-report-status?batch_name=B2")
+    assert asyncio.run(status.get_json()) == {"P1": {"submitted": True}, "P2": {"submitted": True}, "P3": {"available": True}}
+    assert status.headers["X-Status-Token"]
+    assert call("get", "/get-report-status")[0].status_code == 400
+
+def test_operational_routes(call):
+    assert call("get", "/pool-stats")[0].status_code == 200
+    metrics, body = call("get", "/metrics")
+    assert metrics.status_code == 200 and b"http_requests_total" in body
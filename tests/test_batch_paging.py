@@ -0,0 +1,50 @@
+import json
+import pytest
+from routes import patient_routes
+from services.patient_store import load_batch_patients
+
+@pytest.mark.parametrize("limit", ["-1", "0", "abc", ""])
+def test_invalid_limit_is_rejected(client, batch, limit):
+    response = client.get(f"/get-batch-data2?batch_name={batch}&limit={limit}")
+    assert response.status_code == 400
+
+def test_pages_follow_the_cursor(client, batch):
+    first = client.get(f"/get-batch-data2?batch_name={batch}&limit=1")
+    cursor = first.headers["X-Next-Cursor"]
+    assert first.status_code == 200 and len(first.json) == 1
+
+    second = client.get(f"/get-batch-data2?batch_name={batch}&limit=1&after={cursor}")
+    assert second.status_code == 200 and len(second.json) == 1
+    assert "X-Next-Cursor" not in second.headers
+    assert set(first.json).isdisjoint(second.json)
+
+def test_limit_is_capped(client, batch, monkeypatch):
+    monkeypatch.setattr(patient_routes, "MAX_BATCH_PAGE", 1)
+    response = client.get(f"/get-batch-data2?batch_name={batch}&limit=500")
+    assert len(response.json) == 1
+    assert response.headers["X-Next-Cursor"]
+
+def test_unknown_cursor_is_rejected(client, batch):
+    response = client.get(f"/get-batch-data2?batch_name={batch}&limit=1&after=NOBODY")
+    assert response.status_code == 400
+    assert "NOBODY" in response.json["error"]
+
+def test_unknown_cursor_is_rejected_for_embedded_batches(mongo, batch):
+    patients = list(mongo["patients"].find({"batch_name": batch}, {"_id": 0, "patient_id": 1, "files": 1}))
+    mongo["batches"].update_one({"batch_name": batch}, {"$set": {"patients": patients}, "$unset": {"patients_in_collection": ""}})
+
+    page, _ = load_batch_patients(batch, after=patients[0]["patient_id"], limit=1)
+    assert [patient["patient_id"] for patient in page] == [patients[1]["patient_id"]]
+    with pytest.raises(ValueError):
+        load_batch_patients(batch, after="NOBODY", limit=1)
+
+@pytest.mark.parametrize("rows_per_line", ["0", "-2", "abc"])
+def test_invalid_rows_per_line_is_rejected(client, batch, rows_per_line):
+    response = client.get(f"/get-batch-data2?batch_name={batch}&format=ndjson&rows_per_line={rows_per_line}")
+    assert response.status_code == 400
+
+def test_rows_per_line_splits_patients(client, batch):
+    response = client.get(f"/get-batch-data2?batch_name={batch}&format=ndjson&rows_per_line=1")
+    lines = [json.loads(line) for line in response.data.splitlines()]
+    assert {line["file"] for line in lines[:-1]} == {f"{batch}_P0000.xlsx", f"{batch}_P0001.xlsx"}
+    assert all(len(line["conditions"]) <= 1 for line in lines[:-1])
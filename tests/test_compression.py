@@ -0,0 +1,15 @@
+import gzip
+import json
+import pytest
+
+def test_zstd_is_negotiated(client, batch):
+    zstandard = pytest.importorskip("zstandard")
+    plain = client.get(f"/get-batch-data2?batch_name={batch}")
+
+    response = client.get(f"/get-batch-data2?batch_name={batch}", headers={"Accept-Encoding": "gzip, zstd"})
+    assert response.headers["Content-Encoding"] == "zstd"
+    assert json.loads(zstandard.ZstdDecompressor().decompressobj().decompress(response.data)) == plain.json
+
+    response = client.get(f"/get-batch-data2?batch_name={batch}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.data)) == plain.json
@@ -0,0 +1,17 @@
+import os
+from services.excel_cache import ExcelCache
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ExcelCache(max_bytes=10_000_000, cache_dir=str(tmp_path), disk_max_bytes=3_500)
+    for index in range(3):
+        cache.put(f"k{index}", "x" * 1_000)
+        os.utime(cache._disk_path(f"k{index}"), (index, index))  # k0 oldest
+
+    cache.clear()
+    assert cache.get("k0") is not None  # Disk hit refreshes k0
+    cache.put("k3", "x" * 1_000)
+
+    assert not os.path.exists(cache._disk_path("k1"))
+    assert all(os.path.exists(cache._disk_path(key)) for key in ("k0", "k2", "k3"))
+    assert sum(entry.stat().st_size for entry in os.scandir(tmp_path)) <= 3_500
+    assert cache.stats()["disk_bytes"] <= 3_500
@@ -0,0 +1,17 @@
+import pytest
+import mongo_connection
+
+@pytest.fixture
+def json_file(mongo, batch):
+    mongo_connection.get_fs().put(
+        b'{"report": true}', filename="B1_P0000_report.json", batch=batch, patient_id="B1_P0000", json_validated=True
+    )
+    return f"/json/{batch}/B1_P0000/report"
+
+@pytest.mark.parametrize("path", ["/patient_files/B1/B1_P0000/pdf", "/f/B1/B1_P0000", "json"])
+def test_unsatisfiable_range_is_416(client, batch, json_file, path):
+    response = client.get(json_file if path == "json" else path, headers={"Range": "bytes=90000000-90000010"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"].startswith("bytes */")
+
+    assert client.get(json_file if path == "json" else path, headers={"Range": "bytes=0-9"}).status_code == 206
@@ -0,0 +1,56 @@
+import hashlib
+import os
+from bson import ObjectId
+from benchmarks.workbook_generator import WorkbookPool, make_workbook, write_batch_dir
+from config.store import store_new_batch
+
+def test_rerun_skips_only_unchanged_patients(mongo, tmp_path):
+    batch_dir = tmp_path / "B5"
+    write_batch_dir(str(batch_dir), 2, WorkbookPool(rows=5, distinct=2), pdf_size=1000)
+
+    first = store_new_batch(str(batch_dir))
+    assert (first["uploaded"], first["resumed_past"]) == (4, 0)
+
+    rerun = store_new_batch(str(batch_dir))
+    assert (rerun["uploaded"], rerun["resumed_past"]) == (0, 2)
+
+    changed = batch_dir / "B5_P0001" / "B5_P0001.xlsx"
+    changed.write_bytes(make_workbook(rows=6, seed=99))
+    after_change = store_new_batch(str(batch_dir))
+    assert (after_change["uploaded"], after_change["resumed_past"]) == (1, 1)
+
+    patient = mongo["patients"].find_one({"batch_name": "B5", "patient_id": "B5_P0001"})
+    excel = mongo["fs.files"].find_one({"_id": ObjectId(patient["files"]["excel"])})
+    assert excel["length"] == os.path.getsize(changed)
+
+def test_checkpoints_without_hashes_are_rechecked(mongo, tmp_path):
+    batch_dir = tmp_path / "B6"
+    write_batch_dir(str(batch_dir), 1, WorkbookPool(rows=5), pdf_size=1000)
+    store_new_batch(str(batch_dir))
+    mongo["ingest_checkpoints"].update_many({}, {"$unset": {"hashes": ""}})  # Written before hashes were stored
+
+    rerun = store_new_batch(str(batch_dir))
+    assert (rerun["uploaded"], rerun["skipped"], rerun["resumed_past"]) == (0, 2, 0)
+    assert mongo["ingest_checkpoints"].find_one({"batch": "B6"})["hashes"]
+
+def test_resaved_workbook_with_identical_sheets_is_stored(mongo, tmp_path):
+    import openpyxl
+    from config.schema import ensure_indexes
+
+    ensure_indexes(mongo, ["fs.files"])
+    batch_dir = tmp_path / "B7"
+    write_batch_dir(str(batch_dir), 1, WorkbookPool(rows=5), pdf_size=1000)
+    store_new_batch(str(batch_dir))
+
+    path = batch_dir / "B7_P0000" / "B7_P0000.xlsx"
+    workbook = openpyxl.load_workbook(path)
+    workbook.properties.creator = "re-saved"  # Same sheets, new bytes, same Arrow sidecar
+    workbook.save(path)
+
+    rerun = store_new_batch(str(batch_dir))
+    assert rerun["uploaded"] == 1
+    checkpoint = mongo["ingest_checkpoints"].find_one({"batch": "B7", "patient_id": "B7_P0000"})
+    assert checkpoint["hashes"]["B7_P0000.xlsx"] == hashlib.sha256(path.read_bytes()).hexdigest()
+    patient = mongo["patients"].find_one({"batch_name": "B7", "patient_id": "B7_P0000"})
+    sidecar = mongo["fs.files"].find_one({"sidecar_of": ObjectId(patient["files"]["excel"])})
+    assert sidecar["blob_sha256"] and "sha256" not in sidecar
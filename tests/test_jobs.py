@@ -0,0 +1,107 @@
+import gzip
+import json
+from datetime import timedelta
+from config.config import JOB_STALE_SECONDS
+from mongo_connection import get_fs
+from services import job_service
+from services.excel_cache import excel_cache
+from services.job_service import claim_job, enqueue_job, get_job, make_view, run_job
+from services.patient_service import extract_batch_data2
+
+def read_result(file_id):
+    return gzip.decompress(get_fs().get(file_id).read())
+
+def run_next_job():
+    job = claim_job("test-worker")
+    assert job is not None
+    run_job(job)
+    return get_job(str(job["_id"]))
+
+def test_enqueue_returns_the_active_job(mongo, batch):
+    first = enqueue_job(batch, [make_view("batch_data")])
+    again = enqueue_job(batch, [make_view("batch_data")])
+    other = enqueue_job(batch, [make_view("batch_data2")])
+
+    assert again["_id"] == first["_id"]
+    assert other["_id"] != first["_id"]
+    assert mongo["extraction_jobs"].count_documents({}) == 2
+
+    job_service._finish(first, "done")
+    assert enqueue_job(batch, [make_view("batch_data")])["_id"] != first["_id"]
+
+def test_claim_skips_live_jobs_and_reclaims_stale_ones(mongo, batch):
+    job = enqueue_job(batch, [make_view("batch_data2")])
+
+    claimed = claim_job("worker-a")
+    assert claimed["_id"] == job["_id"]
+    assert (claimed["status"], claimed["worker"], claimed["attempts"]) == ("running", "worker-a", 1)
+    assert claim_job("worker-b") is None
+
+    stale = claimed["heartbeat"] - timedelta(seconds=JOB_STALE_SECONDS + 1)
+    mongo["extraction_jobs"].update_one({"_id": job["_id"]}, {"$set": {"heartbeat": stale}})
+    reclaimed = claim_job("worker-b")
+    assert (reclaimed["worker"], reclaimed["attempts"]) == ("worker-b", 2)
+
+def test_run_job_reports_progress_and_stores_results(mongo, batch):
+    job = enqueue_job(batch, [make_view("batch_data2")])
+    done = run_next_job()
+
+    assert done["status"] == "done"
+    assert done["progress"] == {"done": 2, "total": 2}
+    assert "active" not in done
+
+    stored = json.loads(read_result(done["results"][job["view_keys"][0]]))
+    assert stored == json.loads(json.dumps(extract_batch_data2(batch)))
+
+def test_newer_result_expires_the_older_one(mongo, client, batch):
+    enqueue_job(batch, [make_view("batch_data2")])
+    first = run_next_job()
+    enqueue_job(batch, [make_view("batch_data2")])
+    second = run_next_job()
+
+    assert get_job(str(first["_id"]))["status"] == "expired"
+    assert mongo["fs.files"].count_documents({"_id": {"$in": list(first["results"].values())}}) == 0
+    assert client.get(f"/jobs/{first['_id']}/result").status_code == 410
+    assert client.get(f"/jobs/{second['_id']}/result").status_code == 200
+
+def test_async_request_queues_a_job_and_serves_its_result(mongo, client, batch):
+    url = f"/get-batch-data2?batch_name={batch}&async=1"
+    queued = client.get(url)
+    assert queued.status_code == 202
+    assert client.get(url).json["job_id"] == queued.json["job_id"]
+
+    location = queued.headers["Location"]
+    assert client.get(f"{location}/result").status_code == 409
+
+    run_next_job()
+    status = client.get(location).json
+    assert status["status"] == "done"
+    assert status["progress"]["percent"] == 100.0
+
+    result = client.get(f"{location}/result")
+    assert result.status_code == 200
+    assert json.loads(result.data) == json.loads(json.dumps(extract_batch_data2(batch)))
+
+def test_stored_result_is_served_without_async(mongo, client, batch):
+    enqueue_job(batch, [make_view("batch_data2")])
+    expected = json.loads(read_result(next(iter(run_next_job()["results"].values()))))
+    excel_cache.clear()
+
+    misses = excel_cache.stats()["misses"]
+    response = client.get(f"/get-batch-data2?batch_name={batch}")
+    assert response.status_code == 200
+    assert json.loads(response.data) == expected
+    assert excel_cache.stats()["misses"] == misses  # Streamed from GridFS, nothing parsed
+
+def test_inline_extraction_reuses_the_batch_lookup(mongo, client, batch, monkeypatch):
+    from services import patient_service
+
+    calls = []
+    load = patient_service.load_batch_patients
+    monkeypatch.setattr(patient_service, "load_batch_patients", lambda *args, **kwargs: calls.append(args) or load(*args, **kwargs))
+
+    for path in ("/get-batch-data", "/get-batch-data2"):
+        calls.clear()
+        response = client.get(f"{path}?batch_name={batch}")
+        assert response.status_code == 200
+        assert len(calls) == 1
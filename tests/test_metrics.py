@@ -0,0 +1,57 @@
+import asyncio
+from flask import Flask, Response
+from quart.wrappers.response import IterableBody
+from services import metrics
+
+def test_streamed_flask_response_is_traced_until_sent():
+    app = Flask(__name__)
+    metrics.init_app(app)
+
+    @app.route("/stream")
+    def stream():
+        def body():
+            with metrics.stage("stream_body"):
+                yield b"chunk"
+        return Response(body())
+
+    client = app.test_client()
+    response = client.get("/stream")
+    assert response.data == b"chunk"
+    response.close()
+
+    assert ("/stream", "stream_body") in metrics.STAGE_SECONDS._values  # Recorded inside the request's trace
+    assert metrics.REQUESTS._values[("/stream", "GET", 200)] == 1
+
+def test_traced_body_finishes_after_the_body():
+    async def send():
+        trace = metrics.begin_request("/async-stream")
+        body = metrics.TracedBody(IterableBody([b"a", b"b"]), "GET", 200, trace)
+        async with body as chunks:
+            received = [chunk async for chunk in chunks]
+            assert "finished" not in trace
+        return trace, received
+
+    trace, received = asyncio.run(send())
+    assert received == [b"a", b"b"]
+    assert trace["finished"]
+    assert metrics.REQUESTS._values[("/async-stream", "GET", 200)] == 1
+
+def test_run_in_executor_keeps_the_request_trace(async_db):
+    import async_app
+
+    async def handle():
+        trace = metrics.begin_request("/executor")
+        await async_app.run_in_executor(metrics.record_stage, "excel_parse", 0.25)
+        return trace
+
+    assert asyncio.run(handle())["stages"] == {"excel_parse": 0.25}
+
+def test_motor_commands_count_towards_the_request():
+    from motor.frameworks.asyncio import run_on_executor
+
+    async def handle():
+        trace = metrics.begin_request("/motor")
+        await run_on_executor(asyncio.get_running_loop(), metrics.command_listener.started, None)
+        return trace
+
+    assert asyncio.run(handle())["mongo_round_trips"] == 1
@@ -0,0 +1,23 @@
+import os
+import pytest
+from concurrent.futures.process import BrokenProcessPool
+from services import patient_service
+
+@pytest.fixture
+def parse_pool(monkeypatch):
+    monkeypatch.setattr(patient_service, "EXTRACT_WORKERS", 2)
+    monkeypatch.setattr(patient_service, "_executor", None)
+    yield
+    if patient_service._executor is not None:
+        patient_service._executor.shutdown(cancel_futures=True)
+
+def test_dead_worker_does_not_break_later_parses(batch, parse_pool):
+    broken = patient_service.get_parse_executor()
+    with pytest.raises(BrokenProcessPool):
+        broken.submit(os._exit, 1).result(timeout=30)  # A worker dies, like an OOM kill
+
+    workbooks = patient_service.extract_batch_workbooks(batch)
+
+    assert len(workbooks) == 2
+    assert all("error" not in data for _, data in workbooks)
+    assert patient_service.get_parse_executor() is not broken
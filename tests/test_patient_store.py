@@ -0,0 +1,12 @@
+from services.patient_store import patient_directory, save_patients
+
+def test_directory_reads_only_patients_of_migrated_batches(mongo):
+    mongo["batches"].insert_many([
+        {"batch_name": "M1", "patients_in_collection": True},
+        {"batch_name": "E1", "patients": [{"patient_id": "E1_P2"}, {"patient_id": "E1_P1"}]},
+    ])
+    save_patients("M1", [{"patient_id": "M1_P2"}, {"patient_id": "M1_P1"}])
+    save_patients("E1", [{"patient_id": "E1_STALE"}])  # Left behind, E1 still embeds its patients
+    save_patients("GONE", [{"patient_id": "GONE_P1"}])  # Batch document deleted
+
+    assert patient_directory() == {"M1": ["M1_P1", "M1_P2"], "E1": ["E1_P1", "E1_P2"]}
@@ -0,0 +1,47 @@
+import pytest
+from datetime import datetime, timedelta
+from config.config import STATUS_TOKEN_OVERLAP_MS
+from services.report_service import backfill_status_timestamps, decode_status_token, encode_status_token
+
+def submit(client, patient_id):
+    return client.post("/submit-report", json={"selectedBatch": "B1", "selectedPatient": patient_id, "report_data": [{"a": 1}]})
+
+def test_timestamps_are_set_by_the_server(mongo, client):
+    assert submit(client, "P1").status_code == 200
+    client.post("/update-availability", json={"batch_name": "B1", "patient_id": "P2", "availability": "available"})
+
+    report = mongo["submitted_reports"].find_one({"patient_id": "P1"})
+    status = mongo["availability_status"].find_one({"patient_id": "P2"})
+    assert isinstance(report["timestamp"], datetime)
+    assert isinstance(status["updated_at"], datetime)
+
+def test_delta_poll_rereads_the_overlap_window(mongo, client):
+    submit(client, "P1")
+    full = client.get("/get-report-status?batch_name=B1")
+    token = full.headers["X-Status-Token"]
+    assert full.json == {"P1": {"submitted": True}}
+
+    # A write stamped just before the token that only became visible after the poll
+    late = decode_status_token(token) - timedelta(milliseconds=STATUS_TOKEN_OVERLAP_MS // 2)
+    mongo["availability_status"].insert_one({"batch": "B1", "patient_id": "P3", "available": False, "updated_at": late})
+
+    delta = client.get(f"/get-report-status?batch_name=B1&since={token}")
+    assert delta.json["P3"] == {"available": False}
+    assert delta.headers["X-Status-Token"] == token  # Never moves backwards
+
+    too_old = decode_status_token(token) - timedelta(milliseconds=STATUS_TOKEN_OVERLAP_MS * 2)
+    mongo["availability_status"].insert_one({"batch": "B1", "patient_id": "P4", "available": True, "updated_at": too_old})
+    assert "P4" not in client.get(f"/get-report-status?batch_name=B1&since={token}").json
+
+def test_backfill_stamps_statuses_without_updated_at(mongo, client):
+    mongo["availability_status"].insert_one({"batch": "B1", "patient_id": "P5", "available": True})
+    since = encode_status_token(datetime.utcnow() - timedelta(minutes=1))
+
+    assert backfill_status_timestamps(mongo) == 1
+    assert client.get(f"/get-report-status?batch_name=B1&since={since}").json == {"P5": {"available": True}}
+
+@pytest.mark.parametrize("since", ["99999999999999999999", "-1", "abc"])
+def test_invalid_since_token_is_rejected(client, since):
+    response = client.get(f"/get-report-status?batch_name=B1&since={since}")
+    assert response.status_code == 400
+    assert response.json == {"error": "Invalid since token"}
@@ -0,0 +1,6 @@
+from config.schema import INDEXES, _declared
+from services.variant_service import VARIANT_FILTERS
+
+def test_every_variant_filter_has_a_leading_index():
+    leading = {keys[0][0] for keys, _ in map(_declared, INDEXES["variants"])}
+    assert {field for field, _ in VARIANT_FILTERS.values()} <= leading
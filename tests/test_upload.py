@@ -0,0 +1,59 @@
+import io
+import mongomock
+from bson import ObjectId
+from config.schema import ensure_indexes
+from config.store import store_file_in_gridfs
+
+def _upload(client, *parts):
+    return client.post(
+        "/upload-pdf?batch_name=B2&patient_id=P1",
+        data={"pdfs": [(io.BytesIO(content), name) for name, content in parts]},
+        content_type="multipart/form-data"
+    )
+
+def test_identical_pdfs_are_stored_once(client, mongo):
+    ensure_indexes(mongo, ["fs.files"])
+    pdf = b"%PDF-1.4 " + b"x" * 300_000
+
+    first = _upload(client, ("a.pdf", pdf), ("b.pdf", pdf), ("c.pdf", b"%PDF-1.4 other"))
+    assert first.status_code == 200
+    statuses = sorted(f["status"] for f in first.get_json()["files"])
+    assert statuses == ["duplicate", "stored", "stored"]
+
+    again = _upload(client, ("d.pdf", pdf))
+    assert again.get_json()["files"][0]["status"] == "duplicate"
+
+    assert mongo["fs.files"].count_documents({"batch": "B2", "patient_id": "P1"}) == 2
+    stored_ids = {file_doc["_id"] for file_doc in mongo["fs.files"].find()}
+    assert set(mongo["fs.chunks"].distinct("files_id")) == stored_ids  # No chunks left by rejected copies
+
+def test_ingest_reuses_a_copy_stored_meanwhile(mongo, tmp_path, monkeypatch):
+    import config.store
+
+    ensure_indexes(mongo, ["fs.files"])
+    path = tmp_path / "P1.pdf"
+    path.write_bytes(b"%PDF-1.4 report")
+    real_fs = config.store.fs
+    winner = {}
+
+    class RacingFS:
+        def put(self, data, **kwargs):
+            # Another ingest stores the same file between the lookup and this write
+            winner["id"] = real_fs.put(b"%PDF-1.4 report", **{**kwargs, "_id": ObjectId(), "filename": "other.pdf"})
+            return real_fs.put(data, **kwargs)
+
+    monkeypatch.setattr(config.store, "fs", RacingFS())
+    file_id, uploaded = store_file_in_gridfs(str(path), "P1.pdf", "pdf", "B2", "P1")
+
+    assert (file_id, uploaded) == (winner["id"], False)
+    assert mongo["fs.files"].count_documents({}) == 1
+    assert mongo["fs.chunks"].distinct("files_id") == [winner["id"]]
+
+def test_existing_duplicates_do_not_block_other_indexes():
+    database = mongomock.MongoClient()["legacy"]  # Stored before the unique index existed
+    for _ in range(2):
+        database["fs.files"].insert_one({"sha256": "same", "batch": "B2", "patient_id": "P1", "filename": "x.pdf"})
+
+    created = ensure_indexes(database, ["fs.files"])
+    assert "sidecar_of_1" in created["fs.files"]
+    assert "sha256_1_batch_1_patient_id_1" not in created["fs.files"]
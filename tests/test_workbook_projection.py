@@ -0,0 +1,41 @@
+import pytest
+from benchmarks.workbook_generator import make_workbook
+from services.arrow_sidecar import arrow_available, encode_sheets, read_sidecar_sheets
+from services.workbook_parser import (
+    CONDITION_KEYS, build_patient_data, make_projection, parse_workbook, project_patient_data, read_sheets
+)
+
+SINGLE_FIELD_PROJECTIONS = [make_projection(fields=[key]) for key in CONDITION_KEYS]
+
+@pytest.fixture(scope="module")
+def workbook():
+    return make_workbook(rows=12, variant_rows=5, seed=7)
+
+@pytest.fixture(scope="module")
+def cached(workbook):
+    """
+    The full parse the workbook cache holds; projections of it are the cached path.
+    """
+    return parse_workbook(workbook)
+
+@pytest.mark.parametrize("projection", SINGLE_FIELD_PROJECTIONS, ids=CONDITION_KEYS)
+def test_cold_projection_matches_cached(workbook, cached, projection):
+    assert parse_workbook(workbook, projection=projection) == project_patient_data(cached, projection)
+
+@pytest.mark.skipif(not arrow_available(), reason="pyarrow is not installed")
+@pytest.mark.parametrize("projection", SINGLE_FIELD_PROJECTIONS, ids=CONDITION_KEYS)
+def test_sidecar_projection_matches_cached(workbook, cached, projection, tmp_path):
+    blob, index = encode_sheets(read_sheets(workbook))
+    path = tmp_path / "sidecar.arrow"
+    path.write_bytes(blob)
+
+    sheets = read_sidecar_sheets(str(path), index, projection=projection)
+    assert build_patient_data(sheets, projection=projection) == project_patient_data(cached, projection)
+
+def test_variant_sheets_keep_rows_without_projected_columns(workbook, cached):
+    projection = make_projection(fields=["Condition"])
+    conditions = parse_workbook(workbook, projection=projection)["conditions"]
+
+    variants = [row for row in conditions if row["Condition"] in ("Pathogenic Variants", "Conflicting Variants")]
+    assert len(variants) == 10
+    assert len(conditions) == len(cached["conditions"])